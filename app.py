@@ -1,11 +1,40 @@
 # backend/app.py
 
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes.test_routes import router as test_router
 from routes.hr_routes import router as hr_router
+from controller.controller import router as candidate_router
+from utils.serialization import DefaultResponse, msgpack_negotiation, add_compression
+from services.checkpoints import start_checkpoint_flusher, stop_checkpoint_flusher
+from services.leaderboard import rebuild_leaderboards
+from services.evaluation_queue import (
+    start_evaluation_worker, stop_evaluation_worker, pending_evaluations, load_pending_evaluations
+)
+from services.circuit_breaker import breaker_states
+from services.expiry_index import start_expiry_watcher, stop_expiry_watcher
+from services.purger import start_purger, stop_purger
+from services.token_accounting import load_today
+from services.admission import admission_stats
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_checkpoint_flusher()
+    start_evaluation_worker()
+    start_expiry_watcher()
+    await start_purger()
+    await asyncio.to_thread(load_today)
+    await asyncio.to_thread(load_pending_evaluations)
+    app.state.leaderboard_rebuild = asyncio.create_task(rebuild_leaderboards())
+    yield
+    await stop_checkpoint_flusher()
+    stop_evaluation_worker()
+    stop_expiry_watcher()
+    stop_purger()
 
-app = FastAPI()
+app = FastAPI(default_response_class=DefaultResponse, lifespan=lifespan)
 
 # 🚨 CORS: Allow frontend to access API
 app.add_middleware(
@@ -16,9 +45,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# msgpack for internal consumers, then compression of whatever gets sent
+app.middleware("http")(msgpack_negotiation)
+add_compression(app)
+
 app.include_router(test_router, prefix="/api/test")
 app.include_router(hr_router, prefix="/api/hr")
+app.include_router(candidate_router, prefix="/api/candidate")
 
 @app.get("/")
 async def root():
     return {"message": "HR Test Automation API is live 🚀"}
+
+@app.get("/metrics")
+async def metrics():
+    """Operational state of the service"""
+    return {
+        "circuit_breakers": breaker_states(),
+        "pending_evaluations": pending_evaluations(),
+        "admission": admission_stats()
+    }
@@ -0,0 +1,14 @@
+-- Indexes backing the hot queries of the API.
+-- Apply once in the Supabase SQL editor; every statement is idempotent.
+
+-- GET /api/hr/questions/{jd_id}: keyset pagination ordered by (created_at, id)
+create index if not exists questions_jd_id_created_at_idx
+    on questions (jd_id, created_at desc, id desc);
+
+-- Questions of one set (fetch_test, deletes, per-test counts)
+create index if not exists questions_question_set_id_idx
+    on questions (question_set_id);
+
+-- GET /api/hr/questions/{jd_id}: live sets of the JD, their expiry backs the status filter
+create index if not exists question_sets_jd_id_idx
+    on question_sets (jd_id) where deleted_at is null;
@@ -0,0 +1,199 @@
+import os
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "supabase" (production), "sqlite" (offline development, load tests)
+# or "supabase+sqlite-cache" (Supabase with a local read-through cache)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "local.db")
+
+
+class Repository(ABC):
+    """
+    Every query the API runs. Rows are plain dicts with the Supabase column names,
+    JSON columns (options, answers, languages, question_scores, llm_usage, pending_submission) are decoded.
+    """
+
+    # question_sets
+
+    @abstractmethod
+    def insert_question_sets(self, rows: list):
+        ...
+
+    @abstractmethod
+    def get_question_set(self, question_set_id: str):
+        """The set, or None when it doesn't exist or was soft deleted"""
+
+    @abstractmethod
+    def list_question_sets(self) -> list:
+        """id, created_at, expires_at, duration of every live set, newest first"""
+
+    @abstractmethod
+    def list_active_question_sets(self, now: str) -> list:
+        """id, expires_at of live sets expiring after now"""
+
+    @abstractmethod
+    def list_question_set_ids_for_jd(self, jd_id: str) -> list:
+        ...
+
+    @abstractmethod
+    def list_soft_deleted_question_set_ids(self) -> list:
+        ...
+
+    @abstractmethod
+    def update_question_set_expiry(self, question_set_id: str, expires_at: str) -> bool:
+        ...
+
+    @abstractmethod
+    def soft_delete_question_set(self, question_set_id: str, deleted_at: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete_question_set(self, question_set_id: str):
+        ...
+
+    # questions
+
+    @abstractmethod
+    def insert_questions(self, rows: list):
+        ...
+
+    @abstractmethod
+    def list_questions_for_set(self, question_set_id: str, columns=("question", "options")) -> list:
+        ...
+
+    @abstractmethod
+    def count_questions_for_set(self, question_set_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def list_recent_questions(self, limit: int) -> list:
+        """jd_id, question, options, answer, difficulty of the newest questions"""
+
+    @abstractmethod
+    def page_questions_by_jd(self, jd_id: str, columns: list, limit: int, cursor=None,
+                             question_set_id=None, question_type=None, status=None,
+                             now=None, include_total=False):
+        """
+        Keyset page ordered by (created_at, id) descending.
+        cursor is the (created_at, id) of the last row of the previous page.
+        status filters on the owning set's expiry, questions of soft-deleted sets are left out.
+        Returns (rows, total), total is None unless include_total.
+        """
+
+    @abstractmethod
+    def delete_expired_questions(self, now: str):
+        ...
+
+    # test_results
+
+    @abstractmethod
+    def insert_test_results(self, rows: list) -> list:
+        ...
+
+    @abstractmethod
+    def update_test_result(self, result_id, data: dict):
+        ...
+
+    @abstractmethod
+    def list_results_by_candidate(self, candidate_id: str) -> list:
+        ...
+
+    @abstractmethod
+    def existing_candidate_ids(self, candidate_ids: list) -> set:
+        ...
+
+    @abstractmethod
+    def list_results_for_set(self, question_set_id: str) -> list:
+        """Every result of a set, newest first"""
+
+    @abstractmethod
+    def count_results_for_set(self, question_set_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def list_question_scores(self, question_set_id: str) -> list:
+        """question_scores of every graded result of a set"""
+
+    @abstractmethod
+    def page_scored_results(self, offset: int, limit: int, statuses: tuple) -> list:
+        """Results attached to a set with one of statuses, ordered by id, for rebuilding leaderboards"""
+
+    @abstractmethod
+    def list_pending_evaluations(self) -> list:
+        """id, pending_submission of results still waiting for a deferred evaluation"""
+
+    @abstractmethod
+    def list_result_usage(self, question_set_id: str) -> list:
+        """llm_usage of every result of a set that has one"""
+
+    @abstractmethod
+    def list_usage_since(self, since: str) -> list:
+        """llm_usage of results and question sets created since the given time"""
+
+    # test_checkpoints
+
+    @abstractmethod
+    def get_checkpoint(self, question_set_id: str, candidate_id: str):
+        ...
+
+    @abstractmethod
+    def upsert_checkpoints(self, rows: list):
+        ...
+
+    @abstractmethod
+    def delete_checkpoint(self, question_set_id: str, candidate_id: str):
+        ...
+
+    @abstractmethod
+    def delete_checkpoints_for_set(self, question_set_id: str) -> int:
+        ...
+
+    # purging
+
+    @abstractmethod
+    def delete_chunk_for_set(self, table: str, question_set_id: str, limit: int) -> int:
+        """Delete up to limit rows of table belonging to a set, returns how many were deleted"""
+
+
+def create_repository(backend: str = None, path: str = None) -> Repository:
+    """A new repository for backend, STORAGE_BACKEND by default"""
+    backend = backend or STORAGE_BACKEND
+    path = path or SQLITE_PATH
+    if backend == "sqlite":
+        from db.sqlite_repository import SQLiteRepository
+        return SQLiteRepository(path)
+
+    from db.supabase_repository import SupabaseRepository
+    if backend == "supabase+sqlite-cache":
+        from db.sqlite_repository import SQLiteRepository, ReadThroughRepository
+        return ReadThroughRepository(SupabaseRepository(), SQLiteRepository(path))
+    if backend == "supabase":
+        return SupabaseRepository()
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend}")
+
+
+_repository = None
+
+
+def get_repository() -> Repository:
+    """The process-wide repository, created on first use"""
+    global _repository
+    if _repository is None:
+        _repository = create_repository()
+    return _repository
+
+
+class _LazyRepository:
+    """
+    Stands in for the process-wide repository so modules can import it at load time.
+    The backend modules import this one, so it can only be built once they have loaded.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_repository(), name)
+
+
+repository = _LazyRepository()
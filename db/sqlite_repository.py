@@ -0,0 +1,378 @@
+import json
+import sqlite3
+import threading
+from db.repository import Repository
+
+_NOW = "(strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))"
+
+SCHEMA = f"""
+create table if not exists question_sets (
+    id text primary key,
+    jd_id text,
+    created_at text not null default {_NOW},
+    expires_at text,
+    duration integer default 20,
+    token_budget integer,
+    llm_usage text,
+    deleted_at text
+);
+create table if not exists questions (
+    id integer primary key autoincrement,
+    question_set_id text,
+    jd_id text,
+    question text,
+    options text,
+    answer text,
+    difficulty text,
+    created_at text not null default {_NOW},
+    expires_at text
+);
+create index if not exists questions_jd_id_created_at_idx on questions (jd_id, created_at desc, id desc);
+create index if not exists questions_question_set_id_idx on questions (question_set_id);
+create index if not exists question_sets_jd_id_idx on question_sets (jd_id) where deleted_at is null;
+create table if not exists test_results (
+    id integer primary key autoincrement,
+    candidate_id text,
+    email text,
+    name text,
+    candidate_email text,
+    candidate_name text,
+    question_set_id text,
+    score real,
+    max_score real,
+    percentage real,
+    status text,
+    total_questions integer,
+    raw_feedback text,
+    question_scores text,
+    llm_usage text,
+    pending_submission text,
+    duration_used_seconds integer,
+    duration_used_minutes real,
+    completed_at text,
+    created_at text not null default {_NOW}
+);
+create index if not exists test_results_question_set_id_idx on test_results (question_set_id);
+create index if not exists test_results_candidate_id_idx on test_results (candidate_id);
+create table if not exists test_checkpoints (
+    question_set_id text not null,
+    candidate_id text not null,
+    answers text not null default '[]',
+    languages text,
+    duration_used integer,
+    updated_at text not null default {_NOW},
+    primary key (question_set_id, candidate_id)
+);
+"""
+
+# Columns stored as JSON text
+JSON_COLUMNS = {"options", "answers", "languages", "question_scores", "llm_usage", "pending_submission"}
+
+# Columns added after the first release, created on databases that predate them
+_ADDED_COLUMNS = (
+    ("test_results", "pending_submission", "text"),
+    ("questions", "difficulty", "text"),
+)
+
+# Tables delete_chunk_for_set may touch
+_CHUNKED_TABLES = {"test_results", "questions"}
+
+
+class SQLiteRepository(Repository):
+    """Embedded backend for offline development, load tests and as a local cache"""
+
+    def __init__(self, path: str = "local.db"):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("pragma journal_mode=wal")
+            self._conn.execute("pragma synchronous=normal")
+            self._conn.executescript(SCHEMA)
+            for table, column, column_type in _ADDED_COLUMNS:
+                existing = {r["name"] for r in self._conn.execute(f"pragma table_info({table})")}
+                if column not in existing:
+                    self._conn.execute(f"alter table {table} add column {column} {column_type}")
+
+    # helpers
+
+    @staticmethod
+    def _encode(row: dict) -> dict:
+        return {k: json.dumps(v) if k in JSON_COLUMNS and v is not None else v for k, v in row.items()}
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> dict:
+        return {k: json.loads(row[k]) if k in JSON_COLUMNS and row[k] is not None else row[k] for k in row.keys()}
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            return [self._decode(r) for r in self._conn.execute(sql, params).fetchall()]
+
+    def _execute(self, sql: str, params=()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def _insert(self, table: str, rows: list, upsert_keys=None, ignore_existing=False) -> list:
+        if not rows:
+            return []
+        inserted = []
+        with self._lock:
+            self._conn.execute("begin")
+            try:
+                for row in rows:
+                    row = self._encode(row)
+                    columns = ", ".join(row)
+                    placeholders = ", ".join("?" for _ in row)
+                    verb = "insert or ignore" if ignore_existing else "insert"
+                    sql = f"{verb} into {table} ({columns}) values ({placeholders})"
+                    if upsert_keys:
+                        updates = ", ".join(f"{c} = excluded.{c}" for c in row if c not in upsert_keys)
+                        sql += f" on conflict ({', '.join(upsert_keys)}) do update set {updates}"
+                    cur = self._conn.execute(sql + " returning *", tuple(row.values()))
+                    stored = cur.fetchone()
+                    if stored is not None:
+                        inserted.append(self._decode(stored))
+                self._conn.execute("commit")
+            except Exception:
+                self._conn.execute("rollback")
+                raise
+        return inserted
+
+    # question_sets
+
+    def insert_question_sets(self, rows: list):
+        self._insert("question_sets", rows)
+
+    def get_question_set(self, question_set_id: str):
+        rows = self._query("select * from question_sets where id = ? and deleted_at is null", (question_set_id,))
+        return rows[0] if rows else None
+
+    def list_question_sets(self) -> list:
+        return self._query(
+            "select id, created_at, expires_at, duration from question_sets "
+            "where deleted_at is null order by created_at desc"
+        )
+
+    def list_active_question_sets(self, now: str) -> list:
+        return self._query(
+            "select id, expires_at from question_sets where expires_at > ? and deleted_at is null", (now,)
+        )
+
+    def list_question_set_ids_for_jd(self, jd_id: str) -> list:
+        rows = self._query("select id from question_sets where jd_id = ? and deleted_at is null", (jd_id,))
+        return [row["id"] for row in rows]
+
+    def list_soft_deleted_question_set_ids(self) -> list:
+        return [row["id"] for row in self._query("select id from question_sets where deleted_at is not null")]
+
+    def update_question_set_expiry(self, question_set_id: str, expires_at: str) -> bool:
+        return self._execute(
+            "update question_sets set expires_at = ? where id = ? and deleted_at is null",
+            (expires_at, question_set_id)
+        ) > 0
+
+    def soft_delete_question_set(self, question_set_id: str, deleted_at: str) -> bool:
+        return self._execute(
+            "update question_sets set deleted_at = ? where id = ? and deleted_at is null",
+            (deleted_at, question_set_id)
+        ) > 0
+
+    def delete_question_set(self, question_set_id: str):
+        self._execute("delete from question_sets where id = ?", (question_set_id,))
+
+    # questions
+
+    def insert_questions(self, rows: list):
+        self._insert("questions", rows)
+
+    def cache_questions(self, rows: list):
+        """Insert rows copied from another backend, keeping their ids so a second copy is ignored"""
+        self._insert("questions", rows, ignore_existing=True)
+
+    def list_questions_for_set(self, question_set_id: str, columns=("question", "options")) -> list:
+        return self._query(
+            f"select {', '.join(columns)} from questions where question_set_id = ? order by id",
+            (question_set_id,)
+        )
+
+    def count_questions_for_set(self, question_set_id: str) -> int:
+        return self._query("select count(*) as n from questions where question_set_id = ?", (question_set_id,))[0]["n"]
+
+    def list_recent_questions(self, limit: int) -> list:
+        return self._query(
+            "select jd_id, question, options, answer, difficulty from questions order by created_at desc limit ?", (limit,)
+        )
+
+    def page_questions_by_jd(self, jd_id: str, columns: list, limit: int, cursor=None,
+                             question_set_id=None, question_type=None, status=None,
+                             now=None, include_total=False):
+        where, params = ["jd_id = ?"], [jd_id]
+        if question_set_id:
+            where.append("question_set_id = ?")
+            params.append(question_set_id)
+        if question_type == "mcq":
+            where.append("options is not null")
+        elif question_type == "coding":
+            where.append("options is null")
+        # Expiry and soft deletion live on the set, extending a test doesn't touch its questions
+        sets = "select id from question_sets where jd_id = ? and deleted_at is null"
+        params.append(jd_id)
+        if status == "active":
+            sets += " and expires_at > ?"
+            params.append(now)
+        elif status == "expired":
+            sets += " and expires_at <= ?"
+            params.append(now)
+        where.append(f"question_set_id in ({sets})")
+
+        total = None
+        if include_total:
+            total = self._query(f"select count(*) as n from questions where {' and '.join(where)}", params)[0]["n"]
+
+        if cursor:
+            where.append("(created_at < ? or (created_at = ? and id < ?))")
+            params += [cursor[0], cursor[0], cursor[1]]
+
+        rows = self._query(
+            f"select {', '.join(columns)} from questions where {' and '.join(where)} "
+            "order by created_at desc, id desc limit ?",
+            params + [limit]
+        )
+        return rows, total
+
+    def delete_expired_questions(self, now: str):
+        self._execute("delete from questions where expires_at < ?", (now,))
+
+    # test_results
+
+    def insert_test_results(self, rows: list) -> list:
+        return self._insert("test_results", rows)
+
+    def update_test_result(self, result_id, data: dict):
+        data = self._encode(data)
+        assignments = ", ".join(f"{c} = ?" for c in data)
+        self._execute(f"update test_results set {assignments} where id = ?", (*data.values(), result_id))
+
+    def list_results_by_candidate(self, candidate_id: str) -> list:
+        return self._query("select * from test_results where candidate_id = ?", (candidate_id,))
+
+    def existing_candidate_ids(self, candidate_ids: list) -> set:
+        if not candidate_ids:
+            return set()
+        placeholders = ", ".join("?" for _ in candidate_ids)
+        rows = self._query(
+            f"select distinct candidate_id from test_results where candidate_id in ({placeholders})",
+            candidate_ids
+        )
+        return {row["candidate_id"] for row in rows}
+
+    def list_results_for_set(self, question_set_id: str) -> list:
+        return self._query(
+            "select * from test_results where question_set_id = ? order by created_at desc", (question_set_id,)
+        )
+
+    def count_results_for_set(self, question_set_id: str) -> int:
+        return self._query(
+            "select count(*) as n from test_results where question_set_id = ?", (question_set_id,)
+        )[0]["n"]
+
+    def list_question_scores(self, question_set_id: str) -> list:
+        rows = self._query(
+            "select question_scores from test_results where question_set_id = ? and question_scores is not null",
+            (question_set_id,)
+        )
+        return [row["question_scores"] for row in rows]
+
+    def page_scored_results(self, offset: int, limit: int, statuses: tuple) -> list:
+        placeholders = ", ".join("?" for _ in statuses)
+        return self._query(
+            "select question_set_id, candidate_id, candidate_name, score, max_score, percentage, "
+            "duration_used_seconds from test_results where question_set_id is not null "
+            f"and status in ({placeholders}) order by id limit ? offset ?",
+            (*statuses, limit, offset)
+        )
+
+    def list_pending_evaluations(self) -> list:
+        return self._query(
+            "select id, pending_submission from test_results where pending_submission is not null order by id"
+        )
+
+    def list_result_usage(self, question_set_id: str) -> list:
+        rows = self._query(
+            "select llm_usage from test_results where question_set_id = ? and llm_usage is not null",
+            (question_set_id,)
+        )
+        return [row["llm_usage"] for row in rows]
+
+    def list_usage_since(self, since: str) -> list:
+        rows = self._query(
+            "select llm_usage from test_results where created_at >= ? and llm_usage is not null "
+            "union all select llm_usage from question_sets where created_at >= ? and llm_usage is not null",
+            (since, since)
+        )
+        return [row["llm_usage"] for row in rows]
+
+    # test_checkpoints
+
+    def get_checkpoint(self, question_set_id: str, candidate_id: str):
+        rows = self._query(
+            "select * from test_checkpoints where question_set_id = ? and candidate_id = ?",
+            (question_set_id, candidate_id)
+        )
+        return rows[0] if rows else None
+
+    def upsert_checkpoints(self, rows: list):
+        self._insert("test_checkpoints", rows, upsert_keys=("question_set_id", "candidate_id"))
+
+    def delete_checkpoint(self, question_set_id: str, candidate_id: str):
+        self._execute(
+            "delete from test_checkpoints where question_set_id = ? and candidate_id = ?",
+            (question_set_id, candidate_id)
+        )
+
+    def delete_checkpoints_for_set(self, question_set_id: str) -> int:
+        return self._execute("delete from test_checkpoints where question_set_id = ?", (question_set_id,))
+
+    # purging
+
+    def delete_chunk_for_set(self, table: str, question_set_id: str, limit: int) -> int:
+        if table not in _CHUNKED_TABLES:
+            raise ValueError(f"Cannot purge table {table}")
+        return self._execute(
+            f"delete from {table} where id in (select id from {table} where question_set_id = ? limit ?)",
+            (question_set_id, limit)
+        )
+
+
+class ReadThroughRepository:
+    """
+    Supabase for everything, with the questions of each set cached in SQLite.
+    Questions never change once a set is finalized, so the cache only has to
+    drop them when the set is purged. Question sets themselves are not cached
+    because their expiry and deleted state can change from any worker.
+    """
+
+    def __init__(self, primary: Repository, cache: SQLiteRepository):
+        self.primary = primary
+        self.cache = cache
+
+    def __getattr__(self, name):
+        # Everything not overridden below goes straight to the primary backend
+        return getattr(self.primary, name)
+
+    def list_questions_for_set(self, question_set_id: str, columns=("question", "options")) -> list:
+        cached = self.cache.list_questions_for_set(question_set_id, columns)
+        if cached:
+            return cached
+        rows = self.primary.list_questions_for_set(
+            question_set_id,
+            ("id", "question_set_id", "jd_id", "question", "options", "answer", "created_at", "expires_at")
+        )
+        # Workers sharing the cache may miss at the same time, the primary's ids keep one copy
+        self.cache.cache_questions(rows)
+        return [{k: row.get(k) for k in columns} for row in rows]
+
+    def delete_question_set(self, question_set_id: str):
+        while self.cache.delete_chunk_for_set("questions", question_set_id, 1000):
+            pass
+        self.primary.delete_question_set(question_set_id)
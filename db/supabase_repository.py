@@ -0,0 +1,208 @@
+from db.supabase import supabase
+from db.repository import Repository
+
+
+class SupabaseRepository(Repository):
+    """Production backend on the Supabase PostgREST API"""
+
+    def __init__(self, client=None):
+        self.client = client or supabase
+
+    def _table(self, name: str):
+        return self.client.table(name)
+
+    # question_sets
+
+    def insert_question_sets(self, rows: list):
+        if rows:
+            self._table("question_sets").insert(rows).execute()
+
+    def get_question_set(self, question_set_id: str):
+        res = self._table("question_sets").select("*").eq("id", question_set_id).is_("deleted_at", "null").execute()
+        return res.data[0] if res.data else None
+
+    def list_question_sets(self) -> list:
+        res = self._table("question_sets").select("id, created_at, expires_at, duration").is_(
+            "deleted_at", "null"
+        ).order("created_at", desc=True).execute()
+        return res.data or []
+
+    def list_active_question_sets(self, now: str) -> list:
+        res = self._table("question_sets").select("id, expires_at").gt("expires_at", now).is_(
+            "deleted_at", "null"
+        ).execute()
+        return res.data or []
+
+    def list_question_set_ids_for_jd(self, jd_id: str) -> list:
+        res = self._table("question_sets").select("id").eq("jd_id", jd_id).is_("deleted_at", "null").execute()
+        return [row["id"] for row in res.data or []]
+
+    def list_soft_deleted_question_set_ids(self) -> list:
+        res = self._table("question_sets").select("id").not_.is_("deleted_at", "null").execute()
+        return [row["id"] for row in res.data or []]
+
+    def update_question_set_expiry(self, question_set_id: str, expires_at: str) -> bool:
+        res = self._table("question_sets").update({"expires_at": expires_at}).eq(
+            "id", question_set_id
+        ).is_("deleted_at", "null").execute()
+        return bool(res.data)
+
+    def soft_delete_question_set(self, question_set_id: str, deleted_at: str) -> bool:
+        res = self._table("question_sets").update({"deleted_at": deleted_at}).eq(
+            "id", question_set_id
+        ).is_("deleted_at", "null").execute()
+        return bool(res.data)
+
+    def delete_question_set(self, question_set_id: str):
+        self._table("question_sets").delete().eq("id", question_set_id).execute()
+
+    # questions
+
+    def insert_questions(self, rows: list):
+        if rows:
+            self._table("questions").insert(rows).execute()
+
+    def list_questions_for_set(self, question_set_id: str, columns=("question", "options")) -> list:
+        res = self._table("questions").select(", ".join(columns)).eq(
+            "question_set_id", question_set_id
+        ).order("id").execute()
+        return res.data or []
+
+    def count_questions_for_set(self, question_set_id: str) -> int:
+        res = self._table("questions").select("id", count="exact").eq("question_set_id", question_set_id).execute()
+        return res.count or 0
+
+    def list_recent_questions(self, limit: int) -> list:
+        res = self._table("questions").select("jd_id, question, options, answer, difficulty").order(
+            "created_at", desc=True
+        ).limit(limit).execute()
+        return res.data or []
+
+    def page_questions_by_jd(self, jd_id: str, columns: list, limit: int, cursor=None,
+                             question_set_id=None, question_type=None, status=None,
+                             now=None, include_total=False):
+        query = self._table("questions").select(
+            ", ".join(columns), count="exact" if include_total else None
+        ).eq("jd_id", jd_id)
+
+        if question_set_id:
+            query = query.eq("question_set_id", question_set_id)
+        if question_type == "mcq":
+            query = query.not_.is_("options", "null")
+        elif question_type == "coding":
+            query = query.is_("options", "null")
+        # Expiry and soft deletion live on the set, extending a test doesn't touch its questions
+        sets = self._table("question_sets").select("id").eq("jd_id", jd_id).is_("deleted_at", "null")
+        if status == "active":
+            sets = sets.gt("expires_at", now)
+        elif status == "expired":
+            sets = sets.lte("expires_at", now)
+        set_ids = [row["id"] for row in sets.execute().data or []]
+        if not set_ids:
+            return [], 0 if include_total else None
+        query = query.in_("question_set_id", set_ids)
+        if cursor:
+            created_at, row_id = cursor
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}")'
+            )
+
+        res = query.order("created_at", desc=True).order("id", desc=True).limit(limit).execute()
+        return res.data or [], res.count if include_total else None
+
+    def delete_expired_questions(self, now: str):
+        self._table("questions").delete().lt("expires_at", now).execute()
+
+    # test_results
+
+    def insert_test_results(self, rows: list) -> list:
+        if not rows:
+            return []
+        res = self._table("test_results").insert(rows).execute()
+        return res.data or []
+
+    def update_test_result(self, result_id, data: dict):
+        self._table("test_results").update(data).eq("id", result_id).execute()
+
+    def list_results_by_candidate(self, candidate_id: str) -> list:
+        res = self._table("test_results").select("*").eq("candidate_id", candidate_id).execute()
+        return res.data or []
+
+    def existing_candidate_ids(self, candidate_ids: list) -> set:
+        if not candidate_ids:
+            return set()
+        res = self._table("test_results").select("candidate_id").in_("candidate_id", candidate_ids).execute()
+        return {row["candidate_id"] for row in res.data or []}
+
+    def list_results_for_set(self, question_set_id: str) -> list:
+        res = self._table("test_results").select("*").eq("question_set_id", question_set_id).order(
+            "created_at", desc=True
+        ).execute()
+        return res.data or []
+
+    def count_results_for_set(self, question_set_id: str) -> int:
+        res = self._table("test_results").select("id", count="exact").eq("question_set_id", question_set_id).execute()
+        return res.count or 0
+
+    def list_question_scores(self, question_set_id: str) -> list:
+        res = self._table("test_results").select("question_scores").eq(
+            "question_set_id", question_set_id
+        ).not_.is_("question_scores", "null").execute()
+        return [row["question_scores"] for row in res.data or []]
+
+    def page_scored_results(self, offset: int, limit: int, statuses: tuple) -> list:
+        res = self._table("test_results").select(
+            "question_set_id, candidate_id, candidate_name, score, max_score, percentage, duration_used_seconds"
+        ).not_.is_("question_set_id", "null").in_("status", list(statuses)).order("id").range(offset, offset + limit - 1).execute()
+        return res.data or []
+
+    def list_pending_evaluations(self) -> list:
+        res = self._table("test_results").select("id, pending_submission").not_.is_(
+            "pending_submission", "null"
+        ).order("id").execute()
+        return res.data or []
+
+    def list_result_usage(self, question_set_id: str) -> list:
+        res = self._table("test_results").select("llm_usage").eq(
+            "question_set_id", question_set_id
+        ).not_.is_("llm_usage", "null").execute()
+        return [row["llm_usage"] for row in res.data or []]
+
+    def list_usage_since(self, since: str) -> list:
+        usage = []
+        for table in ("test_results", "question_sets"):
+            res = self._table(table).select("llm_usage").gte("created_at", since).not_.is_(
+                "llm_usage", "null"
+            ).execute()
+            usage += [row["llm_usage"] for row in res.data or []]
+        return usage
+
+    # test_checkpoints
+
+    def get_checkpoint(self, question_set_id: str, candidate_id: str):
+        res = self._table("test_checkpoints").select("*").eq(
+            "question_set_id", question_set_id
+        ).eq("candidate_id", candidate_id).execute()
+        return res.data[0] if res.data else None
+
+    def upsert_checkpoints(self, rows: list):
+        if rows:
+            self._table("test_checkpoints").upsert(rows, on_conflict="question_set_id,candidate_id").execute()
+
+    def delete_checkpoint(self, question_set_id: str, candidate_id: str):
+        self._table("test_checkpoints").delete().eq(
+            "question_set_id", question_set_id
+        ).eq("candidate_id", candidate_id).execute()
+
+    def delete_checkpoints_for_set(self, question_set_id: str) -> int:
+        res = self._table("test_checkpoints").delete().eq("question_set_id", question_set_id).execute()
+        return len(res.data or [])
+
+    # purging
+
+    def delete_chunk_for_set(self, table: str, question_set_id: str, limit: int) -> int:
+        res = self._table(table).select("id").eq("question_set_id", question_set_id).limit(limit).execute()
+        ids = [row["id"] for row in res.data or []]
+        if ids:
+            self._table(table).delete().in_("id", ids).execute()
+        return len(ids)
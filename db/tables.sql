@@ -0,0 +1,31 @@
+-- Tables added on top of the original Supabase schema.
+-- Apply once in the Supabase SQL editor; every statement is idempotent.
+
+-- In-progress answers autosaved by POST /api/test/checkpoint
+create table if not exists test_checkpoints (
+    question_set_id uuid not null,
+    candidate_id text not null,
+    answers jsonb not null default '[]'::jsonb,
+    languages jsonb,
+    duration_used integer,
+    updated_at timestamptz not null default now(),
+    primary key (question_set_id, candidate_id)
+);
+
+-- Per-question scores (0-10, in question order) parsed at evaluation time
+alter table test_results add column if not exists question_scores jsonb;
+
+-- Soft delete marker, rows are purged in the background by services/purger.py
+alter table question_sets add column if not exists deleted_at timestamptz;
+
+-- LLM token accounting: usage of the grading call and of generating the set
+alter table test_results add column if not exists llm_usage jsonb;
+alter table question_sets add column if not exists llm_usage jsonb;
+-- Max tokens the set's evaluations may consume, null for the TEST_TOKEN_BUDGET default
+alter table question_sets add column if not exists token_budget integer;
+
+-- Difficulty the questions were generated for, matched when reusing them
+alter table questions add column if not exists difficulty text;
+
+-- Submission kept while its evaluation is deferred, reloaded by the worker after a restart
+alter table test_results add column if not exists pending_submission jsonb;
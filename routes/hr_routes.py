@@ -1,47 +1,98 @@
-from fastapi import APIRouter, HTTPException
-from schemas.test_schemas import TestRequest, TestFinalizeRequest
+import os
+import json
+import base64
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from schemas.test_schemas import TestRequest, TestFinalizeRequest, BulkTestRequest
 from services.test_generator import generate_questions
-from db.supabase import supabase
+from services.question_index import question_index
+from services.leaderboard import get_leaderboard, forget_test
+from services import item_analytics, token_accounting
+from services.events import broker, publish_event, HR_CHANNEL
+from services import expiry_index
+from services.purger import schedule_purge, purge_status
+from services.admission import generation_limiter
+from db.repository import repository
 from uuid import uuid4
-from typing import List
-from datetime import datetime, timedelta
+from typing import List, Optional, Literal
+from datetime import datetime, timedelta, timezone
 
 router = APIRouter()
 
-@router.post("/generate-test")
-async def create_test(request: TestRequest):
-    # Generate questions using LLM
-    questions = await generate_questions(request)
-    return {"questions": questions}
+TEST_LINK_BASE_URL = "https://react-ai-frontend.vercel.app/test"
 
-@router.post("/finalize-test")
-async def finalize_test(request: TestFinalizeRequest):
+# Seconds between SSE keep-alive comments
+EVENT_HEARTBEAT_SECONDS = 15
+
+# Max number of LLM generations running at once for bulk test creation
+BULK_GENERATION_CONCURRENCY = int(os.getenv("BULK_GENERATION_CONCURRENCY", "5"))
+
+def _build_test_rows(jd_id: str, duration: int, questions: list, token_budget=None, llm_usage=None,
+                     difficulty=None):
+    """Build the question_sets row and its questions rows for one test"""
     question_set_id = str(uuid4())
     created_at = datetime.utcnow()
     expires_at = created_at + timedelta(hours=2)
 
-    # Insert into question_sets with duration
-    supabase.table("question_sets").insert({
+    question_set = {
         "id": question_set_id,
-        "jd_id": request.jd_id,
+        "jd_id": jd_id,
         "created_at": created_at.isoformat(),
         "expires_at": expires_at.isoformat(),
-        "duration": request.duration  # Add duration field
-    }).execute()
-
-    # Insert questions linked to this set
-    for q in request.questions:
-        supabase.table("questions").insert({
-            "question_set_id": question_set_id,
-            "jd_id": request.jd_id,
-            "question": q.question,        # ✅ Access attributes
-            "options": q.options,          # ✅ Might be None
-            "answer": q.answer,            # ✅ Optional
-            "created_at": created_at.isoformat(),
-            "expires_at": expires_at.isoformat()
-        }).execute()
-
-    test_link = f"https://react-ai-frontend.vercel.app/test/{question_set_id}"
+        "duration": duration,
+        "token_budget": token_budget,
+        "llm_usage": llm_usage
+    }
+    question_rows = [{
+        "question_set_id": question_set_id,
+        "jd_id": jd_id,
+        "question": q["question"],
+        "options": q.get("options"),
+        "answer": q.get("answer"),
+        "difficulty": difficulty,
+        "created_at": created_at.isoformat(),
+        "expires_at": expires_at.isoformat()
+    } for q in questions]
+    return question_set, question_rows
+
+def _index_questions(question_rows: list):
+    """Offer persisted questions for reuse, an index that isn't loaded yet reads them from the DB"""
+    if not question_index.loaded:
+        return
+    for row in question_rows:
+        question_index.add([row], row["jd_id"], row["difficulty"])
+
+@router.post("/generate-test")
+async def create_test(request: TestRequest, http_request: Request):
+    # Generate questions using LLM
+    usage = token_accounting.empty_usage()
+    async with generation_limiter.admit(http_request):
+        questions = await generate_questions(request, usage)
+    return {
+        "questions": questions,
+        "difficulty": request.difficulty,
+        "generation_id": token_accounting.remember_generation(usage),
+        "llm_usage": usage
+    }
+
+@router.post("/finalize-test")
+async def finalize_test(request: TestFinalizeRequest):
+    question_set, question_rows = _build_test_rows(
+        request.jd_id, request.duration, [q.dict() for q in request.questions],
+        request.token_budget, token_accounting.claim_generation(request.generation_id), request.difficulty
+    )
+    question_set_id = question_set["id"]
+
+    # Insert into question_sets with duration
+    repository.insert_question_sets([question_set])
+    expiry_index.remember(question_set_id, question_set["expires_at"])
+
+    # Insert all questions linked to this set in one call
+    repository.insert_questions(question_rows)
+    _index_questions(question_rows)
+
+    test_link = f"{TEST_LINK_BASE_URL}/{question_set_id}"
     return {
         "test_link": test_link,
         "test_id": question_set_id,
@@ -50,26 +101,97 @@ async def finalize_test(request: TestFinalizeRequest):
         "message": "Test finalized successfully"
     }
 
+@router.post("/bulk-create-tests")
+async def bulk_create_tests(request: BulkTestRequest, http_request: Request):
+    """Generate and finalize tests for many JDs in one call"""
+    # Every generation running at once takes one of the generation route's in-flight slots
+    concurrency = min(BULK_GENERATION_CONCURRENCY, len(request.tests))
+    if generation_limiter.max_in_flight > 0:
+        concurrency = min(concurrency, generation_limiter.max_in_flight)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def generate_one(item):
+        async with semaphore:
+            # Each test takes its generation token as it starts, the ones over the limit fail on their own
+            wait = generation_limiter.try_take(http_request)
+            if wait:
+                return None, None, f"Rate limited, retry in {max(1, int(wait) + 1)} seconds"
+            try:
+                usage = token_accounting.empty_usage()
+                questions = await generate_questions(TestRequest(
+                    topic="",
+                    difficulty=item.difficulty,
+                    num_questions=item.num_questions,
+                    question_type=item.question_type,
+                    mcq_count=item.mcq_count,
+                    coding_count=item.coding_count,
+                    jd_id=item.jd_id
+                ), usage, allow_fallback=False)
+                return questions, usage, None
+            except Exception as e:
+                print(f"❌ Bulk generation failed for jd_id {item.jd_id}: {str(e)}")
+                return None, None, str(e)
+
+    async with generation_limiter.admit(http_request, cost=0, slots=max(1, concurrency)):
+        generated = await asyncio.gather(*(generate_one(item) for item in request.tests))
+
+    results = []
+    question_sets = []
+    question_rows = []
+    for item, (questions, usage, error) in zip(request.tests, generated):
+        if error:
+            results.append({"jd_id": item.jd_id, "error": error})
+            continue
+
+        question_set, rows = _build_test_rows(
+            item.jd_id, item.duration, questions, item.token_budget, usage, item.difficulty
+        )
+        question_sets.append(question_set)
+        question_rows.extend(rows)
+        results.append({
+            "test_link": f"{TEST_LINK_BASE_URL}/{question_set['id']}",
+            "test_id": question_set["id"],
+            "jd_id": item.jd_id,
+            "duration": item.duration,
+            "question_count": len(rows)
+        })
+
+    try:
+        # Persist all sets, then all questions, in two bulk inserts
+        repository.insert_question_sets(question_sets)
+        repository.insert_questions(question_rows)
+        _index_questions(question_rows)
+        for question_set in question_sets:
+            expiry_index.remember(question_set["id"], question_set["expires_at"])
+    except Exception as e:
+        print(f"❌ Error saving bulk tests: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to save tests: {str(e)}")
+
+    return {
+        "tests": results,
+        "total_created": len(question_sets),
+        "total_failed": len(request.tests) - len(question_sets),
+        "message": "Bulk test creation finished"
+    }
+
 @router.get("/tests")
 async def get_all_tests():
     """Get all tests created by HR with their basic info"""
     try:
         # Fetch all question sets with basic info
-        result = supabase.table("question_sets").select("id, created_at, expires_at, duration").order("created_at", desc=True).execute()
+        question_sets = repository.list_question_sets()
         
         tests = []
-        for test in result.data:
+        for test in question_sets:
             # Get question count for each test
-            questions_result = supabase.table("questions").select("id", count="exact").eq("question_set_id", test["id"]).execute()
-            question_count = questions_result.count or 0
+            question_count = repository.count_questions_for_set(test["id"])
             
             # Get submission count for each test
-            submissions_result = supabase.table("test_results").select("id", count="exact").eq("question_set_id", test["id"]).execute()
-            submission_count = submissions_result.count or 0
+            submission_count = repository.count_results_for_set(test["id"])
             
             # Check if test is still active
-            expires_at = datetime.fromisoformat(test["expires_at"])
-            is_active = datetime.utcnow() < expires_at
+            expires_at = expiry_index.parse_expiry(test["expires_at"])
+            is_active = datetime.now(timezone.utc) < expires_at
             
             tests.append({
                 "test_id": test["id"],
@@ -91,19 +213,48 @@ async def get_all_tests():
         print(f"❌ Error fetching tests: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch tests: {str(e)}")
 
+@router.get("/events")
+async def stream_events(request: Request, test_id: Optional[str] = None):
+    """Server-sent events with submission and expiry deltas, optionally for one test"""
+    async def event_stream():
+        events = broker.subscribe(HR_CHANNEL).__aiter__()
+        next_event = asyncio.ensure_future(events.__anext__())
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                done, _ = await asyncio.wait({next_event}, timeout=EVENT_HEARTBEAT_SECONDS)
+                if not done:
+                    yield ": keep-alive\n\n"
+                    continue
+                event = next_event.result()
+                next_event = asyncio.ensure_future(events.__anext__())
+                if test_id and event.get("test_id") != test_id:
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            next_event.cancel()
+            await asyncio.gather(next_event, return_exceptions=True)
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/tests/{test_id}/results")
 async def get_test_results(test_id: str):
     """Get all submissions/results for a specific test"""
     try:
         # Fetch test results for the specific test
-        result = supabase.table("test_results").select("*").eq("question_set_id", test_id).order("created_at", desc=True).execute()
+        result = repository.list_results_for_set(test_id)
         
         # Also get test info
-        test_info = supabase.table("question_sets").select("duration").eq("id", test_id).execute()
-        test_duration = test_info.data[0]["duration"] if test_info.data else 20
+        test_info = repository.get_question_set(test_id)
+        test_duration = test_info["duration"] if test_info else 20
         
         results = []
-        for res in result.data:
+        for res in result:
             results.append({
                 "result_id": res["id"],
                 "score": res["score"],
@@ -129,46 +280,105 @@ async def get_test_results(test_id: str):
         print(f"❌ Error fetching test results: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch test results: {str(e)}")
 
-@router.delete("/tests/{test_id}")
+@router.get("/tests/{test_id}/leaderboard")
+async def get_test_leaderboard(test_id: str, limit: int = Query(10, ge=1, le=1000)):
+    """Top candidates of a test, ranked by score then time used"""
+    board = get_leaderboard(test_id)
+    return {
+        "test_id": test_id,
+        "total_candidates": len(board) if board else 0,
+        "leaderboard": board.top(limit) if board else []
+    }
+
+@router.get("/tests/{test_id}/leaderboard/{candidate_id}")
+async def get_candidate_rank(test_id: str, candidate_id: str):
+    """Rank of one candidate in a test"""
+    board = get_leaderboard(test_id)
+    entry = board.rank_of(candidate_id) if board else None
+    if not entry:
+        raise HTTPException(status_code=404, detail="Candidate has no result for this test")
+    return {"test_id": test_id, "total_candidates": len(board), **entry}
+
+@router.get("/usage")
+async def get_llm_usage():
+    """LLM token usage and cost today, per JD, test and candidate, with the budgets"""
+    return token_accounting.summary()
+
+@router.get("/tests/{test_id}/usage")
+async def get_test_llm_usage(test_id: str):
+    """LLM token usage of one test against its budget"""
+    try:
+        return token_accounting.test_summary(test_id)
+    except Exception as e:
+        print(f"❌ Error fetching test usage: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch test usage: {str(e)}")
+
+@router.get("/tests/{test_id}/item-analytics")
+async def get_test_item_analytics(test_id: str):
+    """Per-question difficulty, discrimination and score distribution of a test"""
+    try:
+        return item_analytics.test_item_analytics(test_id)
+    except Exception as e:
+        print(f"❌ Error computing item analytics: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute item analytics: {str(e)}")
+
+@router.get("/jd/{jd_id}/item-analytics")
+async def get_jd_item_analytics(jd_id: str):
+    """Item analytics of every test created for a JD"""
+    try:
+        return item_analytics.jd_item_analytics(jd_id)
+    except Exception as e:
+        print(f"❌ Error computing item analytics: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute item analytics: {str(e)}")
+
+@router.delete("/tests/{test_id}", status_code=202)
 async def delete_test(test_id: str):
-    """Delete a test and all its associated data"""
+    """Mark a test deleted, its data is purged in the background"""
     try:
-        # Delete in order: test_results -> questions -> question_sets
+        deleted = repository.soft_delete_question_set(test_id, datetime.utcnow().isoformat())
         
-        # Delete test results
-        supabase.table("test_results").delete().eq("question_set_id", test_id).execute()
-        
-        # Delete questions
-        supabase.table("questions").delete().eq("question_set_id", test_id).execute()
-        
-        # Delete question set
-        result = supabase.table("question_sets").delete().eq("id", test_id).execute()
-        
-        if not result.data:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Test not found")
         
+        schedule_purge(test_id)
+        forget_test(test_id)
+        item_analytics.forget_test(test_id)
+        expiry_index.forget(test_id)
+        await publish_event("test_deleted", test_id=test_id)
+        
         return {
-            "message": "Test deleted successfully",
+            "message": "Test deleted, data purge scheduled",
             "test_id": test_id
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error deleting test: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to delete test: {str(e)}")
 
+@router.get("/tests/{test_id}/purge-status")
+async def get_purge_status(test_id: str):
+    """Progress of the background purge of a deleted test"""
+    status = purge_status(test_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="No purge scheduled for this test")
+    return {"test_id": test_id, **status}
+
 @router.put("/tests/{test_id}/extend")
 async def extend_test_expiry(test_id: str, hours: int = 24):
     """Extend the expiry time of a test"""
     try:
         new_expires_at = datetime.utcnow() + timedelta(hours=hours)
         
-        result = supabase.table("question_sets").update({
-            "expires_at": new_expires_at.isoformat()
-        }).eq("id", test_id).execute()
+        updated = repository.update_question_set_expiry(test_id, new_expires_at.isoformat())
         
-        if not result.data:
+        if not updated:
             raise HTTPException(status_code=404, detail="Test not found")
         
+        expiry_index.remember(test_id, new_expires_at.isoformat())
+        await publish_event("expiry_extended", test_id=test_id, expires_at=new_expires_at.isoformat())
+        
         return {
             "message": f"Test expiry extended by {hours} hours",
             "test_id": test_id,
@@ -180,20 +390,78 @@ async def extend_test_expiry(test_id: str, hours: int = 24):
         raise HTTPException(status_code=500, detail=f"Failed to extend test expiry: {str(e)}")
 
 
+# Columns that can be requested from GET /questions/{jd_id}
+QUESTION_COLUMNS = {"id", "question_set_id", "jd_id", "question", "options", "answer", "created_at", "expires_at"}
+DEFAULT_QUESTION_COLUMNS = ["id", "question_set_id", "question", "options", "created_at", "expires_at"]
+MAX_QUESTIONS_PAGE_SIZE = 500
+
+def _encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["created_at"], row["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return created_at, row_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/questions/{jd_id}")
-async def get_questions_by_jd(jd_id: str):
+async def get_questions_by_jd(
+    jd_id: str,
+    limit: int = Query(50, ge=1, le=MAX_QUESTIONS_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    question_set_id: Optional[str] = None,
+    question_type: Optional[Literal["mcq", "coding"]] = Query(None, alias="type"),
+    status: Optional[Literal["active", "expired"]] = None,
+    include_total: bool = False
+):
+    """
+    Page through a JD's questions, newest first.
+    Uses keyset pagination on (created_at, id), see db/indexes.sql for the supporting index.
+    """
     try:
-        # ✅ Fetch questions from Supabase by jd_id
-        response = supabase.table("questions").select("*").eq("jd_id", jd_id).execute()
- 
-        if not response.data:
+        columns = DEFAULT_QUESTION_COLUMNS
+        if fields:
+            columns = [f.strip() for f in fields.split(",") if f.strip()]
+            unknown = set(columns) - QUESTION_COLUMNS
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        # The cursor is built from these two columns
+        select_columns = list(dict.fromkeys(columns + ["created_at", "id"]))
+
+        # Fetch one extra row to know whether another page exists
+        rows, total = repository.page_questions_by_jd(
+            jd_id,
+            select_columns,
+            limit + 1,
+            cursor=_decode_cursor(cursor) if cursor else None,
+            question_set_id=question_set_id,
+            question_type=question_type,
+            status=status,
+            now=datetime.utcnow().isoformat(),
+            include_total=include_total
+        )
+
+        if not rows and not cursor:
             raise HTTPException(status_code=404, detail="No questions found for this jd_id")
- 
-        return {
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]) if has_more else None
+
+        result = {
             "jd_id": jd_id,
-            "total_questions": len(response.data),
-            "questions": response.data
+            "count": len(rows),
+            "next_cursor": next_cursor,
+            "questions": [{k: row.get(k) for k in columns} for row in rows]
         }
- 
+        if include_total:
+            result["total_questions"] = total
+        return result
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
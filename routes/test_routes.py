@@ -1,37 +1,58 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Request
+from fastapi.encoders import jsonable_encoder
 from datetime import datetime, timezone
-from db.supabase import supabase
-from schemas.test_schemas import TestSubmission
-from services.test_evaluator import evaluate_test
+from typing import Optional
+from db.repository import repository
+from schemas.test_schemas import TestSubmission, AnswerCheckpoint
+from services.test_evaluator import evaluate_test, is_evaluation_error, EVALUATION_PENDING, GRADED_STATUSES
+from services.idempotency import derive_submission_key, run_once, replay_latest
+from services.checkpoints import (
+    save_checkpoint, get_checkpoint, clear_checkpoint, CheckpointBufferFull, CHECKPOINT_FLUSH_INTERVAL
+)
+from services.leaderboard import record_result
+from services.item_analytics import record_scores
+from services.evaluation_queue import enqueue_evaluation
+from services.events import publish_event
+from services import expiry_index
+from services.submission_recorder import record_submission
+from services.admission import submit_limiter, checkpoint_limiter
  
 router = APIRouter()
  
 @router.get("/{question_set_id}")
 async def fetch_test(question_set_id: str):
-    res = supabase.table("question_sets").select("*").eq("id", question_set_id).execute()
-    print("📄 Supabase question_set response:", res)
+    # Known-bad links are answered without touching the DB
+    known_state = expiry_index.lookup(question_set_id)
+    if known_state == expiry_index.UNKNOWN:
+        raise HTTPException(status_code=404, detail="Test not found")
+    if known_state == expiry_index.EXPIRED:
+        raise HTTPException(status_code=410, detail="Test expired")
  
-    if not res.data or len(res.data) == 0:  
+    test_info = repository.get_question_set(question_set_id)
+    print("📄 question_set:", test_info)
+ 
+    if not test_info:  
+        expiry_index.mark_unknown(question_set_id)
         raise HTTPException(status_code=404, detail="Test not found")  
  
-    test_info = res.data[0]  
     expires_at = test_info.get("expires_at")  
     duration = test_info.get("duration", 20)  # Get duration, default to 20 minutes
     jd_id = test_info.get("jd_id")  # Get jd_id from question_sets table
  
     now = datetime.now(timezone.utc)  
-    expires_dt = datetime.fromisoformat(expires_at)  
+    expires_dt = expiry_index.parse_expiry(expires_at)  
+    expiry_index.remember(question_set_id, expires_dt)
  
     if now > expires_dt:  
         raise HTTPException(status_code=410, detail="Test expired")  
  
-    q_res = supabase.table("questions").select("question, options").eq("question_set_id", question_set_id).execute()  
+    questions = repository.list_questions_for_set(question_set_id, ("question", "options"))
  
-    if not q_res.data:  
+    if not questions:  
         raise HTTPException(status_code=404, detail="No questions found")  
  
     return {  
-        "questions": q_res.data,  
+        "questions": questions,  
         "duration": duration,  # Include duration in response
         "jd_id": jd_id,  # Include jd_id in response
         "test_id": question_set_id  
@@ -108,13 +129,92 @@ async def submit_test(submission: TestSubmission):
         "duration_used": duration_used_minutes,
         "candidate_id": submission.candidate_id  # ✅ Return candidate_id in response
     } ''' 
+@router.post("/checkpoint")
+async def checkpoint_answers(checkpoint: AnswerCheckpoint, request: Request):
+    """Autosave in-progress answers, written to Supabase in batches by the flusher"""
+    question_set_id = str(checkpoint.question_set_id)
+    async with checkpoint_limiter.admit(request, checkpoint.candidate_id):
+        _ensure_test_open(question_set_id)
+        try:
+            row = save_checkpoint(
+                question_set_id,
+                checkpoint.candidate_id,
+                checkpoint.answers,
+                checkpoint.languages,
+                checkpoint.duration_used
+            )
+        except CheckpointBufferFull as e:
+            print(f"🚦 Rejecting checkpoint: {e}")
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": str(max(1, int(CHECKPOINT_FLUSH_INTERVAL)))}
+            )
+    return {"message": "Checkpoint saved", "updated_at": row["updated_at"]}
+
+def _ensure_test_open(question_set_id: str):
+    """404 or 410 unless the test exists and is active, the DB is only read for tests the expiry index doesn't track"""
+    known_state = expiry_index.lookup(question_set_id)
+    if known_state == expiry_index.UNKNOWN:
+        raise HTTPException(status_code=404, detail="Test not found")
+    if known_state == expiry_index.EXPIRED:
+        raise HTTPException(status_code=410, detail="Test expired")
+    if expiry_index.is_active(question_set_id):
+        return
+
+    test_info = repository.get_question_set(question_set_id)
+    if not test_info:
+        expiry_index.mark_unknown(question_set_id)
+        raise HTTPException(status_code=404, detail="Test not found")
+    expiry_index.remember(question_set_id, test_info["expires_at"])
+    if expiry_index.lookup(question_set_id) == expiry_index.EXPIRED:
+        raise HTTPException(status_code=410, detail="Test expired")
+ 
+@router.get("/checkpoint/{question_set_id}/{candidate_id}")
+async def fetch_checkpoint(question_set_id: str, candidate_id: str):
+    checkpoint = get_checkpoint(question_set_id, candidate_id)
+    if not checkpoint:
+        raise HTTPException(status_code=404, detail="No checkpoint found")
+    return checkpoint
+ 
 @router.post("/submit")
-async def submit_test(submission: TestSubmission):
+async def submit_test(submission: TestSubmission, request: Request, idempotency_key: Optional[str] = Header(None)):
     print("📨 Received test submission:", submission.dict())
  
+    scope = f"{submission.question_set_id}:{submission.candidate_id}"
+
+    # Finish from the autosaved answers when the client lost its state
+    if submission.answers is None:
+        checkpoint = get_checkpoint(str(submission.question_set_id), submission.candidate_id)
+        if not checkpoint:
+            # The checkpoint is cleared once a submission is stored, a retry gets that submission's result
+            previous = replay_latest(scope)
+            if previous:
+                return previous
+            raise HTTPException(status_code=400, detail="No answers submitted and no checkpoint found")
+        submission.answers = checkpoint["answers"]
+        submission.languages = submission.languages or checkpoint.get("languages")
+        submission.duration_used = submission.duration_used or checkpoint.get("duration_used")
+ 
+    # Browser retries must not evaluate and store the same submission twice
+    if idempotency_key:
+        key = f"client:{submission.candidate_id}:{idempotency_key}"
+    else:
+        key = derive_submission_key(submission)
+ 
+    # Grading costs an LLM call, so throttle per client before doing any work
+    async with submit_limiter.admit(request, submission.candidate_id):
+        return await run_once(key, lambda: _process_submission(submission), cacheable=_is_replayable, scope=scope)
+
+def _is_replayable(result: dict) -> bool:
+    """Errored evaluations and unsaved results are not replayed, a retry processes the submission again"""
+    return not is_evaluation_error(result) and not result.get("database_error")
+ 
+async def _process_submission(submission: TestSubmission):
     # Evaluate the test
     result = await evaluate_test(submission)
     print("✅ Evaluation result:", result)
+    await record_submission(submission, result)
  
     # Calculate duration used in minutes if provided
     duration_used_minutes = None
@@ -135,17 +235,52 @@ async def submit_test(submission: TestSubmission):
             "status": result.get("status", "Fail"),
             "total_questions": len(submission.questions),
             "raw_feedback": result.get("raw_feedback", ""),
+            "question_scores": result.get("question_scores"),
+            "llm_usage": result.get("llm_usage"),
             "duration_used_seconds": submission.duration_used,
             "duration_used_minutes": duration_used_minutes
         }
+        if result.get("status") == EVALUATION_PENDING:
+            # Kept until graded so a restart can pick the evaluation up again
+            insert_data["pending_submission"] = jsonable_encoder(submission)
        
         # Insert into database
-        db_result = supabase.table("test_results").insert(insert_data).execute()
-        print("💾 Saved to database:", db_result.data[0] if db_result.data else "No data returned")
+        db_result = repository.insert_test_results([insert_data])
+        print("💾 Saved to database:", db_result[0] if db_result else "No data returned")
        
         # Add the database ID to the result
-        if db_result.data:
-            result["result_id"] = db_result.data[0].get("id")
+        if db_result:
+            result["result_id"] = db_result[0].get("id")
+
+        # Only now are the answers safe, a failed insert leaves the autosave for the retry
+        clear_checkpoint(str(submission.question_set_id), submission.candidate_id)
+ 
+        if result.get("status") == EVALUATION_PENDING:
+            # Graded in the background once OpenRouter is reachable again
+            if result.get("result_id"):
+                enqueue_evaluation(result["result_id"], submission)
+        else:
+            # Evaluation errors and ungraded answers would rank as a score of 0
+            if insert_data["status"] in GRADED_STATUSES:
+                record_result(str(submission.question_set_id), insert_data)
+            record_scores(
+                str(submission.question_set_id),
+                result.get("question_scores"),
+                [q.question for q in submission.questions]
+            )
+ 
+        await publish_event(
+            "submission",
+            test_id=str(submission.question_set_id),
+            result_id=result.get("result_id"),
+            candidate_id=submission.candidate_id,
+            candidate_name=submission.candidate_name,
+            score=insert_data["score"],
+            max_score=insert_data["max_score"],
+            percentage=insert_data["percentage"],
+            status=insert_data["status"],
+            duration_used_minutes=duration_used_minutes
+        )
            
     except Exception as e:
         print("❌ Error inserting into Supabase:", e)
@@ -20,6 +20,22 @@ class TestFinalizeRequest(BaseModel):
     questions: List[Question]
     duration: Optional[int] = 20
     jd_id: str
+    difficulty: str  # As returned by /generate-test, lets later tests reuse the questions
+    token_budget: Optional[int] = None  # Max tokens for grading this test's submissions
+    generation_id: Optional[str] = None  # As returned by /generate-test, links the test to its LLM usage
+
+class BulkTestItem(BaseModel):
+    jd_id: str
+    difficulty: str
+    num_questions: int
+    question_type: Optional[str] = "mcq"
+    mcq_count: Optional[int] = 0
+    coding_count: Optional[int] = 0
+    duration: Optional[int] = 20
+    token_budget: Optional[int] = None
+
+class BulkTestRequest(BaseModel):
+    tests: List[BulkTestItem]
 
 class TestSubmission(BaseModel):
     question_set_id: UUID
@@ -28,6 +44,13 @@ class TestSubmission(BaseModel):
     candidate_email:str
     candidate_id: str
     questions: List[Question]
+    answers: Optional[List[str]] = None  # Taken from the saved checkpoint when omitted
+    languages: Optional[List[str]] = None
+    duration_used: Optional[int] = None
+
+class AnswerCheckpoint(BaseModel):
+    question_set_id: UUID
+    candidate_id: str
     answers: List[str]
     languages: Optional[List[str]] = None
     duration_used: Optional[int] = None
@@ -41,6 +64,9 @@ class TestResponse(BaseModel):
 class CandidateLoginRequest(BaseModel):
     email: str
 
+class BulkCandidateRegisterRequest(BaseModel):
+    emails: List[str]
+
 class CandidateLoginResponse(BaseModel):
     email: str
     candidate_id: str
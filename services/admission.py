@@ -0,0 +1,177 @@
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import HTTPException, Request
+
+# Honour X-Forwarded-For only when running behind a proxy we control
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+# Max number of client keys tracked per bucket table, least recently seen are dropped first
+ADMISSION_MAX_TRACKED_KEYS = int(os.getenv("ADMISSION_MAX_TRACKED_KEYS", "10000"))
+
+# Retry-After sent when a route is shedding load
+SHED_RETRY_AFTER_SECONDS = int(os.getenv("SHED_RETRY_AFTER_SECONDS", "2"))
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`, each admitted call takes `cost` tokens"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._updated_at = time.monotonic()
+
+    def try_acquire(self, cost: float = 1.0) -> float:
+        """Take `cost` tokens and return 0, or return the seconds until they are available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class BucketTable:
+    """One token bucket per client key, bounded to the most recently seen keys"""
+
+    def __init__(self, rate_per_minute: float, burst: float):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 and self.burst > 0
+
+    def try_acquire(self, key: str, cost: float = 1.0) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > ADMISSION_MAX_TRACKED_KEYS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.try_acquire(cost)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RouteLimiter:
+    """
+    Admission control for one route: per-IP and per-candidate token buckets (429)
+    and a cap on requests being processed at once (503).
+    """
+
+    def __init__(self, name: str, ip_rate_per_minute: float, ip_burst: float,
+                 candidate_rate_per_minute: float, candidate_burst: float, max_in_flight: int):
+        self.name = name
+        self.by_ip = BucketTable(ip_rate_per_minute, ip_burst)
+        self.by_candidate = BucketTable(candidate_rate_per_minute, candidate_burst)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.admitted = 0
+        self.rate_limited_ip = 0
+        self.rate_limited_candidate = 0
+        self.shed = 0
+
+    @asynccontextmanager
+    async def admit(self, request: Request, candidate_key: Optional[str] = None,
+                    cost: float = 1.0, slots: int = 1):
+        """
+        Hold `slots` in-flight slots for the duration of the block, or raise 429/503 with Retry-After.
+        `cost` tokens are taken from each bucket, a cost of 0 only holds the slots.
+        """
+        if self.max_in_flight > 0 and self.in_flight + slots > self.max_in_flight:
+            self.shed += 1
+            print(f"🚦 Shedding '{self.name}' request, {self.in_flight} in flight")
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": str(SHED_RETRY_AFTER_SECONDS)}
+            )
+
+        wait = self.try_take(request, cost)
+        if wait:
+            self._reject(wait)
+
+        if candidate_key and self.by_candidate.enabled:
+            wait = self.by_candidate.try_acquire(candidate_key.strip().lower(), cost)
+            if wait:
+                self.rate_limited_candidate += 1
+                self._reject(wait)
+
+        self.admitted += 1
+        self.in_flight += slots
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= slots
+
+    def try_take(self, request: Request, cost: float = 1.0) -> float:
+        """Take `cost` tokens from the caller's IP bucket, return 0 or the seconds until they are available"""
+        if not self.by_ip.enabled:
+            return 0.0
+        wait = self.by_ip.try_acquire(client_ip(request), cost)
+        if wait:
+            self.rate_limited_ip += 1
+        return wait
+
+    def _reject(self, wait: float):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(1, int(wait) + 1))}
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "max_in_flight": self.max_in_flight,
+            "admitted": self.admitted,
+            "rate_limited_ip": self.rate_limited_ip,
+            "rate_limited_candidate": self.rate_limited_candidate,
+            "shed": self.shed,
+            "tracked_ips": len(self.by_ip),
+            "tracked_candidates": len(self.by_candidate),
+        }
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def _limiter(name: str, env_prefix: str, ip_rate: str, ip_burst: str,
+             candidate_rate: str, candidate_burst: str, max_in_flight: str) -> RouteLimiter:
+    """Limits come from <PREFIX>_* env vars, a rate or cap of 0 turns that check off"""
+    return RouteLimiter(
+        name,
+        ip_rate_per_minute=float(os.getenv(f"{env_prefix}_IP_RATE_PER_MINUTE", ip_rate)),
+        ip_burst=float(os.getenv(f"{env_prefix}_IP_BURST", ip_burst)),
+        candidate_rate_per_minute=float(os.getenv(f"{env_prefix}_CANDIDATE_RATE_PER_MINUTE", candidate_rate)),
+        candidate_burst=float(os.getenv(f"{env_prefix}_CANDIDATE_BURST", candidate_burst)),
+        max_in_flight=int(os.getenv(f"{env_prefix}_MAX_IN_FLIGHT", max_in_flight)),
+    )
+
+
+# Whole cohorts can sit behind one office NAT, so per-IP limits are loose and per-candidate ones tight
+submit_limiter = _limiter("submit", "SUBMIT", "60", "30", "6", "3", "50")
+generation_limiter = _limiter("generation", "GENERATION", "10", "5", "0", "0", "10")
+login_limiter = _limiter("login", "LOGIN", "120", "60", "10", "5", "50")
+# Autosave fires every few seconds per candidate, so its limits sit well above that pace
+checkpoint_limiter = _limiter("checkpoint", "CHECKPOINT", "600", "300", "30", "10", "200")
+
+
+def admission_stats() -> dict:
+    return {l.name: l.snapshot() for l in (submit_limiter, generation_limiter, login_limiter, checkpoint_limiter)}
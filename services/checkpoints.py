@@ -0,0 +1,103 @@
+import os
+import asyncio
+from datetime import datetime, timezone
+from db.repository import repository
+
+# Seconds between two flushes of buffered checkpoints to Supabase
+CHECKPOINT_FLUSH_INTERVAL = float(os.getenv("CHECKPOINT_FLUSH_INTERVAL", "5"))
+
+# Max rows per upsert call
+CHECKPOINT_FLUSH_BATCH_SIZE = int(os.getenv("CHECKPOINT_FLUSH_BATCH_SIZE", "500"))
+
+# Max checkpoints buffered between two flushes, new candidates are turned away beyond it
+CHECKPOINT_MAX_PENDING = int(os.getenv("CHECKPOINT_MAX_PENDING", "20000"))
+
+# (question_set_id, candidate_id) -> latest checkpoint row not yet written
+_pending: dict[tuple[str, str], dict] = {}
+# Rows currently being written, still served to readers until the write lands
+_inflight: dict[tuple[str, str], dict] = {}
+_flush_task = None
+
+
+class CheckpointBufferFull(Exception):
+    """Too many checkpoints are waiting for the flusher, the write must be retried later"""
+
+
+def save_checkpoint(question_set_id: str, candidate_id: str, answers: list, languages=None, duration_used=None) -> dict:
+    """Buffer the latest answers of a candidate, older unflushed states are overwritten"""
+    key = (question_set_id, candidate_id)
+    if key not in _pending and len(_pending) >= CHECKPOINT_MAX_PENDING:
+        raise CheckpointBufferFull(f"{len(_pending)} checkpoints are waiting to be flushed")
+    row = {
+        "question_set_id": question_set_id,
+        "candidate_id": candidate_id,
+        "answers": answers,
+        "languages": languages,
+        "duration_used": duration_used,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    _pending[key] = row
+    return row
+
+
+def get_checkpoint(question_set_id: str, candidate_id: str):
+    """Latest checkpoint, from the buffer if it hasn't been flushed yet"""
+    key = (question_set_id, candidate_id)
+    row = _pending.get(key) or _inflight.get(key)
+    if row:
+        return row
+    return repository.get_checkpoint(question_set_id, candidate_id)
+
+
+def clear_checkpoint(question_set_id: str, candidate_id: str):
+    """Forget a checkpoint once the test has been submitted"""
+    _pending.pop((question_set_id, candidate_id), None)
+    _inflight.pop((question_set_id, candidate_id), None)
+    try:
+        repository.delete_checkpoint(question_set_id, candidate_id)
+    except Exception as e:
+        print(f"❌ Failed to clear checkpoint: {e}")
+
+
+def _write_rows(rows: list):
+    for i in range(0, len(rows), CHECKPOINT_FLUSH_BATCH_SIZE):
+        repository.upsert_checkpoints(rows[i:i + CHECKPOINT_FLUSH_BATCH_SIZE])
+
+
+async def flush_checkpoints():
+    """Write every buffered checkpoint in coalesced upserts"""
+    global _pending, _inflight
+    if not _pending:
+        return
+    batch, _pending = _pending, {}
+    _inflight = batch
+    try:
+        await asyncio.to_thread(_write_rows, list(batch.values()))
+        print(f"💾 Flushed {len(batch)} checkpoints")
+    except Exception as e:
+        print(f"❌ Failed to flush checkpoints: {e}")
+        # Put them back unless a newer state arrived meanwhile
+        for key, row in batch.items():
+            _pending.setdefault(key, row)
+    finally:
+        _inflight = {}
+
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(CHECKPOINT_FLUSH_INTERVAL)
+        await flush_checkpoints()
+
+
+def start_checkpoint_flusher():
+    global _flush_task
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_checkpoint_flusher():
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+    await flush_checkpoints()
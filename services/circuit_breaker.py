@@ -0,0 +1,114 @@
+import os
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker over the last `window` calls.
+    Once open, calls are rejected until `reset_timeout` seconds have passed,
+    then a single probe call is let through (half-open) to decide whether to close again.
+    """
+
+    def __init__(self, name: str, failure_threshold: float = 0.5, window: int = 20,
+                 min_calls: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_started_at = 0.0
+        self.rejected_calls = 0
+        self.times_opened = 0
+
+    def allow_request(self) -> bool:
+        now = time.monotonic()
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+            self._probe_started_at = now
+            return True
+        if self.state == HALF_OPEN and now - self._probe_started_at >= self.reset_timeout:
+            # The previous probe never reported back, let another one through
+            self._probe_started_at = now
+            return True
+        self.rejected_calls += 1
+        return False
+
+    def retry_after(self) -> int:
+        """Seconds until the breaker lets a call through again"""
+        if self.state == CLOSED:
+            return 0
+        started = self._opened_at if self.state == OPEN else self._probe_started_at
+        return max(1, int(self.reset_timeout - (time.monotonic() - started)) + 1)
+
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            self._outcomes.clear()
+            self._transition(CLOSED)
+        self._outcomes.append(True)
+
+    def record_failure(self):
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+        self._outcomes.append(False)
+        if self.state == CLOSED and len(self._outcomes) >= self.min_calls \
+                and self.failure_rate() >= self.failure_threshold:
+            self._open()
+
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        if state != self.state:
+            print(f"⚡ Circuit '{self.name}': {self.state} -> {state}")
+            self.state = state
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failure_rate": round(self.failure_rate(), 3),
+            "window_calls": len(self._outcomes),
+            "rejected_calls": self.rejected_calls,
+            "times_opened": self.times_opened,
+            "retry_after": self.retry_after(),
+        }
+
+
+def _breaker(name: str, env_prefix: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_threshold=float(os.getenv(f"{env_prefix}_BREAKER_FAILURE_RATE", "0.5")),
+        window=int(os.getenv(f"{env_prefix}_BREAKER_WINDOW", "20")),
+        min_calls=int(os.getenv(f"{env_prefix}_BREAKER_MIN_CALLS", "5")),
+        reset_timeout=float(os.getenv(f"{env_prefix}_BREAKER_RESET_SECONDS", "30")),
+    )
+
+
+openrouter_breaker = _breaker("openrouter", "OPENROUTER")
+jd_summary_breaker = _breaker("jd_summary", "JD_SUMMARY")
+candidate_api_breaker = _breaker("candidate_api", "CANDIDATE_API")
+
+
+def is_upstream_failure(status_code: int) -> bool:
+    """Server errors and throttling count against the breaker, client errors don't"""
+    return status_code >= 500 or status_code == 429
+
+
+def breaker_states() -> dict:
+    return {b.name: b.snapshot() for b in (openrouter_breaker, jd_summary_breaker, candidate_api_breaker)}
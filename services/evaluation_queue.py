@@ -0,0 +1,118 @@
+import os
+import asyncio
+from db.repository import repository
+from schemas.test_schemas import TestSubmission
+from services.test_evaluator import evaluate_test, is_evaluation_error, EVALUATION_PENDING, GRADED_STATUSES
+from services.circuit_breaker import openrouter_breaker
+from services.leaderboard import record_result
+from services.item_analytics import record_scores
+from services.events import publish_event
+
+# Errored evaluations are retried with exponential backoff, the last error is stored as the result
+EVALUATION_MAX_ATTEMPTS = int(os.getenv("EVALUATION_MAX_ATTEMPTS", "5"))
+EVALUATION_RETRY_BASE_SECONDS = float(os.getenv("EVALUATION_RETRY_BASE_SECONDS", "10"))
+
+# (result_id, submission, attempts) stored while OpenRouter was unavailable.
+# The submission is also kept in test_results.pending_submission so a restart doesn't lose it.
+_queue: asyncio.Queue = asyncio.Queue()
+_retrying = 0
+_worker_task = None
+
+
+def enqueue_evaluation(result_id, submission: TestSubmission):
+    print(f"🕒 Queued evaluation for result {result_id}")
+    _queue.put_nowait((result_id, submission, 0))
+
+
+def pending_evaluations() -> int:
+    return _queue.qsize() + _retrying
+
+
+def load_pending_evaluations():
+    """Queue the deferred evaluations persisted by a previous run"""
+    try:
+        rows = repository.list_pending_evaluations()
+        for row in rows:
+            _queue.put_nowait((row["id"], TestSubmission(**row["pending_submission"]), 0))
+        print(f"🕒 Reloaded {len(rows)} deferred evaluations")
+    except Exception as e:
+        print(f"❌ Failed to reload deferred evaluations: {e}")
+
+
+def _retry_later(result_id, submission: TestSubmission, attempts: int):
+    global _retrying
+
+    def requeue():
+        global _retrying
+        _retrying -= 1
+        _queue.put_nowait((result_id, submission, attempts))
+
+    _retrying += 1
+    asyncio.get_running_loop().call_later(EVALUATION_RETRY_BASE_SECONDS * 2 ** (attempts - 1), requeue)
+
+
+async def _worker():
+    while True:
+        result_id, submission, attempts = await _queue.get()
+        try:
+            # Wait for the breaker to allow a probe instead of spinning on an open circuit
+            await asyncio.sleep(openrouter_breaker.retry_after())
+            result = await evaluate_test(submission)
+            if result.get("status") == EVALUATION_PENDING:
+                _queue.put_nowait((result_id, submission, attempts))
+                continue
+            if is_evaluation_error(result) and attempts + 1 < EVALUATION_MAX_ATTEMPTS:
+                print(f"🔁 Deferred evaluation for result {result_id} got '{result.get('status')}', retrying")
+                _retry_later(result_id, submission, attempts + 1)
+                continue
+
+            update = {
+                "score": result.get("score", 0),
+                "max_score": result.get("max_score", len(submission.questions) * 10),
+                "percentage": result.get("percentage", 0.0),
+                "status": result.get("status", "Fail"),
+                "raw_feedback": result.get("raw_feedback", ""),
+                "question_scores": result.get("question_scores"),
+                "llm_usage": result.get("llm_usage"),
+            }
+            await asyncio.to_thread(repository.update_test_result, result_id, {**update, "pending_submission": None})
+            if update["status"] in GRADED_STATUSES:
+                record_result(str(submission.question_set_id), {
+                    "candidate_id": submission.candidate_id,
+                    "candidate_name": submission.candidate_name,
+                    "duration_used_seconds": submission.duration_used,
+                    **update
+                })
+            record_scores(
+                str(submission.question_set_id),
+                result.get("question_scores"),
+                [q.question for q in submission.questions]
+            )
+            await publish_event(
+                "submission_graded",
+                test_id=str(submission.question_set_id),
+                result_id=result_id,
+                candidate_id=submission.candidate_id,
+                score=update["score"],
+                max_score=update["max_score"],
+                percentage=update["percentage"],
+                status=update["status"]
+            )
+            print(f"✅ Deferred evaluation stored for result {result_id}")
+        except Exception as e:
+            print(f"❌ Deferred evaluation failed for result {result_id}: {e}")
+        finally:
+            _queue.task_done()
+
+
+def start_evaluation_worker():
+    global _worker_task
+    if _worker_task is None:
+        _worker_task = asyncio.create_task(_worker())
+
+
+def stop_evaluation_worker():
+    global _worker_task
+    if _worker_task is not None:
+        _worker_task.cancel()
+        _worker_task = None
@@ -0,0 +1,68 @@
+import os
+import json
+import asyncio
+
+# "memory" for a single worker, "redis" to fan out across workers
+EVENT_BROKER = os.getenv("EVENT_BROKER", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Events buffered per subscriber before a slow client starts losing them
+SUBSCRIBER_QUEUE_SIZE = 100
+
+HR_CHANNEL = "hr-dashboard"
+
+
+class InProcessBroker:
+    """Pub/sub between coroutines of one process"""
+
+    def __init__(self):
+        self._subscribers: dict[str, set] = {}
+
+    async def publish(self, channel: str, event: dict):
+        for queue in list(self._subscribers.get(channel, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                pass
+
+    async def subscribe(self, channel: str):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(channel, set()).add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[channel].discard(queue)
+
+
+class RedisBroker:
+    """Pub/sub through Redis so every worker sees every event"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+
+    async def publish(self, channel: str, event: dict):
+        await self._redis.publish(channel, json.dumps(event))
+
+    async def subscribe(self, channel: str):
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    yield json.loads(message["data"])
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.close()
+
+
+broker = RedisBroker(REDIS_URL) if EVENT_BROKER == "redis" else InProcessBroker()
+
+
+async def publish_event(event_type: str, **data):
+    """Publish a compact delta to HR dashboards, never fails the caller"""
+    try:
+        await broker.publish(HR_CHANNEL, {"type": event_type, **data})
+    except Exception as e:
+        print(f"❌ Failed to publish {event_type} event: {e}")
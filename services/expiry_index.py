@@ -0,0 +1,167 @@
+import os
+import time
+import heapq
+import asyncio
+from uuid import UUID
+from collections import OrderedDict
+from datetime import datetime, timezone
+from db.repository import repository
+from services.events import broker, publish_event, HR_CHANNEL
+
+# Bounded caches of test ids that need no DB lookup
+NEGATIVE_CACHE_SIZE = int(os.getenv("NEGATIVE_CACHE_SIZE", "10000"))
+NEGATIVE_CACHE_TTL_SECONDS = int(os.getenv("NEGATIVE_CACHE_TTL_SECONDS", "600"))
+EXPIRED_CACHE_SIZE = int(os.getenv("EXPIRED_CACHE_SIZE", "10000"))
+# Bounds how long a worker that missed an expiry_extended event keeps answering 410
+EXPIRED_CACHE_TTL_SECONDS = int(os.getenv("EXPIRED_CACHE_TTL_SECONDS", "300"))
+
+# Seconds between two passes of the expiry watcher
+EXPIRY_WATCH_INTERVAL = float(os.getenv("EXPIRY_WATCH_INTERVAL", "30"))
+
+UNKNOWN = "unknown"
+EXPIRED = "expired"
+
+# id -> expires_at of tests that were still active when last seen
+_active: dict[str, datetime] = {}
+# (expires_at, id) min-heap over _active, stale entries are skipped when popped
+_heap: list[tuple[datetime, str]] = []
+# id -> monotonic time it was cached, for both negative caches
+_expired: OrderedDict = OrderedDict()
+_unknown: OrderedDict = OrderedDict()
+_watch_task = None
+_follow_task = None
+
+
+def parse_expiry(value: str) -> datetime:
+    """Parse a stored expires_at, naive timestamps are UTC"""
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _bounded_add(cache: OrderedDict, key: str, value, max_size: int):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
+
+
+def advance(now: datetime = None) -> list:
+    """Move tests whose expiry has passed from the heap to the expired cache"""
+    now = now or datetime.now(timezone.utc)
+    newly_expired = []
+    while _heap and _heap[0][0] <= now:
+        expires_at, question_set_id = heapq.heappop(_heap)
+        if _active.get(question_set_id) != expires_at:
+            continue  # superseded by an extension or a delete
+        del _active[question_set_id]
+        _bounded_add(_expired, question_set_id, time.monotonic(), EXPIRED_CACHE_SIZE)
+        newly_expired.append((question_set_id, expires_at))
+    return newly_expired
+
+
+def remember(question_set_id: str, expires_at):
+    """Record a test's expiry, called whenever a test is created, read or extended"""
+    if isinstance(expires_at, str):
+        expires_at = parse_expiry(expires_at)
+    if _active.get(question_set_id) == expires_at:
+        return  # already on the heap, fetch_test calls this on every DB hit
+    _unknown.pop(question_set_id, None)
+    _expired.pop(question_set_id, None)
+    if expires_at <= datetime.now(timezone.utc):
+        _bounded_add(_expired, question_set_id, time.monotonic(), EXPIRED_CACHE_SIZE)
+        _active.pop(question_set_id, None)
+        return
+    _active[question_set_id] = expires_at
+    heapq.heappush(_heap, (expires_at, question_set_id))
+
+
+def forget(question_set_id: str):
+    """The test no longer exists"""
+    _active.pop(question_set_id, None)
+    _expired.pop(question_set_id, None)
+    mark_unknown(question_set_id)
+
+
+def mark_unknown(question_set_id: str):
+    _bounded_add(_unknown, question_set_id, time.monotonic(), NEGATIVE_CACHE_SIZE)
+
+
+def lookup(question_set_id: str):
+    """
+    Returns UNKNOWN or EXPIRED when the answer is known without the DB, None otherwise
+    """
+    try:
+        UUID(question_set_id)
+    except ValueError:
+        return UNKNOWN
+
+    seen_at = _unknown.get(question_set_id)
+    if seen_at is not None:
+        if time.monotonic() - seen_at < NEGATIVE_CACHE_TTL_SECONDS:
+            return UNKNOWN
+        _unknown.pop(question_set_id, None)
+
+    cached_at = _expired.get(question_set_id)
+    if cached_at is not None:
+        if time.monotonic() - cached_at < EXPIRED_CACHE_TTL_SECONDS:
+            return EXPIRED
+        _expired.pop(question_set_id, None)
+    expires_at = _active.get(question_set_id)
+    if expires_at and expires_at <= datetime.now(timezone.utc):
+        return EXPIRED  # the watcher moves it to the expired cache on its next pass
+    return None
+
+
+def is_active(question_set_id: str) -> bool:
+    """True when the test is tracked as active, check lookup() first for one that just expired"""
+    return question_set_id in _active
+
+
+def load_active_tests():
+    """Seed the heap with every test that hasn't expired yet"""
+    try:
+        now = datetime.now(timezone.utc).isoformat()
+        for row in repository.list_active_question_sets(now):
+            remember(row["id"], row["expires_at"])
+        print(f"⏳ Expiry index loaded with {len(_active)} active tests")
+    except Exception as e:
+        print(f"❌ Failed to load expiry index: {e}")
+
+
+async def _watch():
+    await asyncio.to_thread(load_active_tests)
+    while True:
+        for question_set_id, expires_at in advance():
+            await publish_event("test_expired", test_id=question_set_id, expires_at=expires_at.isoformat())
+        await asyncio.sleep(EXPIRY_WATCH_INTERVAL)
+
+
+async def _follow_changes():
+    """Apply extensions and deletes made through other workers"""
+    while True:
+        try:
+            async for event in broker.subscribe(HR_CHANNEL):
+                if event.get("type") == "expiry_extended":
+                    remember(event["test_id"], event["expires_at"])
+                elif event.get("type") == "test_deleted":
+                    forget(event["test_id"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Expiry index lost its event subscription: {e}")
+            await asyncio.sleep(EXPIRY_WATCH_INTERVAL)
+
+
+def start_expiry_watcher():
+    global _watch_task, _follow_task
+    if _watch_task is None:
+        _watch_task = asyncio.create_task(_watch())
+        _follow_task = asyncio.create_task(_follow_changes())
+
+
+def stop_expiry_watcher():
+    global _watch_task, _follow_task
+    if _watch_task is not None:
+        _watch_task.cancel()
+        _follow_task.cancel()
+        _watch_task = _follow_task = None
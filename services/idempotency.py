@@ -0,0 +1,87 @@
+import os
+import time
+import json
+import asyncio
+import hashlib
+from schemas.test_schemas import TestSubmission
+
+# How long a completed submission result is replayed for duplicate requests
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+# key -> (created_at, future holding the result dict)
+_entries: dict[str, tuple[float, asyncio.Future]] = {}
+
+# scope -> key of the scope's last stored result, for retries that can't rebuild their key
+_latest: dict[str, str] = {}
+
+
+def derive_submission_key(submission: TestSubmission) -> str:
+    """
+    Build an idempotency key from question_set_id, candidate_id and a hash of the answers
+    """
+    answers_hash = hashlib.sha256(
+        json.dumps(submission.answers, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    return f"{submission.question_set_id}:{submission.candidate_id}:{answers_hash}"
+
+
+def _purge_expired():
+    cutoff = time.monotonic() - IDEMPOTENCY_TTL_SECONDS
+    for key in [k for k, (created, fut) in _entries.items() if fut.done() and created < cutoff]:
+        _entries.pop(key, None)
+    for scope in [s for s, key in _latest.items() if key not in _entries]:
+        _latest.pop(scope, None)
+
+
+def replay_latest(scope: str):
+    """The last stored result of scope, or None"""
+    _purge_expired()
+    entry = _entries.get(_latest.get(scope))
+    if not entry:
+        return None
+    print(f"🔁 Duplicate submission for scope {scope}, reusing result")
+    return {**entry[1].result(), "idempotent_replay": True}
+
+
+async def run_once(key: str, handler, cacheable=None, scope: str = None):
+    """
+    Run handler() once per key.
+    A duplicate arriving while the first call is in flight waits for it,
+    a duplicate arriving after completion gets the stored result.
+    Failed calls, and results rejected by cacheable(result), are forgotten so the client can retry.
+    A stored result also becomes the latest one of scope, see replay_latest.
+    """
+    _purge_expired()
+
+    entry = _entries.get(key)
+    if entry:
+        print(f"🔁 Duplicate submission for key {key}, reusing result")
+        try:
+            result = await asyncio.shield(entry[1])
+            return {**result, "idempotent_replay": True}
+        except asyncio.CancelledError:
+            if not entry[1].cancelled():
+                raise
+            # The original request was cancelled, handle this one ourselves
+            return await run_once(key, handler, cacheable, scope)
+
+    future = asyncio.get_running_loop().create_future()
+    _entries[key] = (time.monotonic(), future)
+    try:
+        result = await handler()
+    except asyncio.CancelledError:
+        _entries.pop(key, None)
+        future.cancel()
+        raise
+    except Exception as e:
+        _entries.pop(key, None)
+        future.set_exception(e)
+        future.exception()  # mark as retrieved so asyncio doesn't warn when nobody waits
+        raise
+
+    future.set_result(result)
+    if cacheable and not cacheable(result):
+        _entries.pop(key, None)
+    elif scope:
+        _latest[scope] = key
+    return result
@@ -0,0 +1,156 @@
+import numpy as np
+from db.repository import repository
+
+MAX_ITEM_SCORE = 10
+HISTOGRAM_BINS = 10
+
+
+class ItemStats:
+    """
+    Running sums over a test's cohort, so statistics update in O(items) per submission.
+    For item score x and candidate total t the corrected item-rest correlation only needs
+    n, sum(x), sum(x^2), sum(t), sum(t^2) and sum(x*t).
+    """
+
+    def __init__(self, num_items: int, labels=None):
+        self.num_items = num_items
+        self.labels = labels or [None] * num_items
+        self.n = 0
+        self.sum_x = np.zeros(num_items)
+        self.sum_x2 = np.zeros(num_items)
+        self.sum_xt = np.zeros(num_items)
+        self.sum_t = 0.0
+        self.sum_t2 = 0.0
+        self.totals: list[float] = []
+
+    def add_many(self, matrix: np.ndarray):
+        """Add a (candidates x items) score matrix to the cohort"""
+        if matrix.size == 0:
+            return
+        totals = matrix.sum(axis=1)
+        self.n += matrix.shape[0]
+        self.sum_x += matrix.sum(axis=0)
+        self.sum_x2 += (matrix ** 2).sum(axis=0)
+        self.sum_xt += (matrix * totals[:, None]).sum(axis=0)
+        self.sum_t += totals.sum()
+        self.sum_t2 += (totals ** 2).sum()
+        self.totals.extend(totals.tolist())
+
+    def add(self, scores: list):
+        self.add_many(np.asarray([scores], dtype=float))
+
+    def summary(self) -> dict:
+        n = self.n
+        if n == 0:
+            return {"cohort_size": 0, "items": [], "score_distribution": None}
+
+        mean_x = self.sum_x / n
+        var_x = self.sum_x2 / n - mean_x ** 2
+
+        # Rest score r = t - x, so the item is not correlated with itself
+        sum_r = self.sum_t - self.sum_x
+        sum_r2 = self.sum_t2 - 2 * self.sum_xt + self.sum_x2
+        sum_xr = self.sum_xt - self.sum_x2
+        mean_r = sum_r / n
+        var_r = sum_r2 / n - mean_r ** 2
+        cov_xr = sum_xr / n - mean_x * mean_r
+
+        denom = np.sqrt(np.clip(var_x, 0, None) * np.clip(var_r, 0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            discrimination = np.where(denom > 1e-12, cov_xr / denom, np.nan)
+
+        difficulty = mean_x / MAX_ITEM_SCORE
+        items = []
+        for i in range(self.num_items):
+            d = None if np.isnan(discrimination[i]) else round(float(discrimination[i]), 3)
+            items.append({
+                "question_index": i,
+                "question": self.labels[i],
+                "difficulty": round(float(difficulty[i]), 3),
+                "mean_score": round(float(mean_x[i]), 2),
+                "std_score": round(float(np.sqrt(max(var_x[i], 0))), 2),
+                "discrimination": d,
+                "flag": _flag(difficulty[i], d)
+            })
+
+        max_total = self.num_items * MAX_ITEM_SCORE
+        counts, edges = np.histogram(np.asarray(self.totals), bins=HISTOGRAM_BINS, range=(0, max_total))
+        totals = np.asarray(self.totals)
+        return {
+            "cohort_size": n,
+            "items": items,
+            "score_distribution": {
+                "bin_edges": edges.round(2).tolist(),
+                "counts": counts.tolist(),
+                "mean": round(float(totals.mean()), 2),
+                "median": round(float(np.median(totals)), 2),
+                "std": round(float(totals.std()), 2),
+                "max_score": max_total
+            }
+        }
+
+
+def _flag(difficulty: float, discrimination):
+    if difficulty >= 0.9:
+        return "too_easy"
+    if difficulty <= 0.2:
+        return "too_hard"
+    if discrimination is not None and discrimination < 0.2:
+        return "non_discriminating"
+    return None
+
+
+_stats: dict[str, ItemStats] = {}
+
+
+def _complete(scores, num_items: int) -> bool:
+    return isinstance(scores, list) and len(scores) == num_items and all(s is not None for s in scores)
+
+
+def _load_test(question_set_id: str):
+    rows = repository.list_question_scores(question_set_id)
+    if not rows:
+        return None
+
+    # The most common length is the test's number of questions
+    num_items = max(set(len(r) for r in rows), key=lambda k: sum(len(r) == k for r in rows))
+    labels = [q["question"] for q in repository.list_questions_for_set(question_set_id, ("question",))]
+
+    stats = ItemStats(num_items, labels if len(labels) == num_items else None)
+    complete = [r for r in rows if _complete(r, num_items)]
+    if complete:
+        stats.add_many(np.asarray(complete, dtype=float))
+    return stats
+
+
+def record_scores(question_set_id: str, question_scores: list, labels=None):
+    """Add one submission to an already loaded test, unloaded tests pick it up from the DB later"""
+    stats = _stats.get(question_set_id)
+    if stats is None or not _complete(question_scores, stats.num_items):
+        return
+    if labels and stats.labels[0] is None and len(labels) == stats.num_items:
+        stats.labels = labels
+    stats.add(question_scores)
+
+
+def test_item_analytics(question_set_id: str) -> dict:
+    stats = _stats.get(question_set_id)
+    if stats is None:
+        stats = _load_test(question_set_id)
+        if stats is None:
+            return {"test_id": question_set_id, "cohort_size": 0, "items": [], "score_distribution": None}
+        _stats[question_set_id] = stats
+    return {"test_id": question_set_id, **stats.summary()}
+
+
+def jd_item_analytics(jd_id: str) -> dict:
+    tests = [test_item_analytics(test_id) for test_id in repository.list_question_set_ids_for_jd(jd_id)]
+    return {
+        "jd_id": jd_id,
+        "cohort_size": sum(t["cohort_size"] for t in tests),
+        "tests": [t for t in tests if t["cohort_size"]]
+    }
+
+
+def forget_test(question_set_id: str):
+    _stats.pop(question_set_id, None)
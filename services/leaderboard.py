@@ -0,0 +1,107 @@
+import bisect
+import asyncio
+from db.repository import repository
+from services.test_evaluator import GRADED_STATUSES
+
+# Rows fetched per request when rebuilding from test_results
+REBUILD_PAGE_SIZE = 1000
+
+
+class Leaderboard:
+    """
+    Candidates of one test kept sorted by score (desc), then time used (asc).
+    Rank lookups are a bisect over the sorted keys.
+    """
+
+    def __init__(self):
+        self._keys: list[tuple] = []
+        self._entries: dict[str, dict] = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    @staticmethod
+    def _key(entry: dict) -> tuple:
+        time_used = entry.get("duration_used_seconds")
+        return (
+            -(entry.get("score") or 0),
+            time_used if time_used is not None else float("inf"),
+            entry["candidate_id"],
+        )
+
+    def upsert(self, entry: dict):
+        old = self._entries.get(entry["candidate_id"])
+        if old:
+            i = bisect.bisect_left(self._keys, self._key(old))
+            del self._keys[i]
+        self._entries[entry["candidate_id"]] = entry
+        bisect.insort(self._keys, self._key(entry))
+
+    def top(self, k: int) -> list:
+        return [
+            {"rank": i + 1, **self._entries[key[2]]}
+            for i, key in enumerate(self._keys[:k])
+        ]
+
+    def rank_of(self, candidate_id: str):
+        entry = self._entries.get(candidate_id)
+        if not entry:
+            return None
+        return {"rank": bisect.bisect_left(self._keys, self._key(entry)) + 1, **entry}
+
+
+_boards: dict[str, Leaderboard] = {}
+
+
+def _entry_from_row(row: dict) -> dict:
+    return {
+        "candidate_id": row["candidate_id"],
+        "candidate_name": row.get("candidate_name"),
+        "score": row.get("score") or 0,
+        "max_score": row.get("max_score"),
+        "percentage": row.get("percentage"),
+        "duration_used_seconds": row.get("duration_used_seconds"),
+    }
+
+
+def record_result(question_set_id: str, row: dict):
+    """Add or update a candidate's result on the test's leaderboard"""
+    if not row.get("candidate_id"):
+        return
+    _boards.setdefault(question_set_id, Leaderboard()).upsert(_entry_from_row(row))
+
+
+def get_leaderboard(question_set_id: str):
+    return _boards.get(question_set_id)
+
+
+def forget_test(question_set_id: str):
+    _boards.pop(question_set_id, None)
+
+
+def _load_all_results():
+    boards: dict[str, Leaderboard] = {}
+    start = 0
+    while True:
+        rows = repository.page_scored_results(start, REBUILD_PAGE_SIZE, GRADED_STATUSES)
+        for row in rows:
+            if row.get("candidate_id"):
+                boards.setdefault(row["question_set_id"], Leaderboard()).upsert(_entry_from_row(row))
+        if len(rows) < REBUILD_PAGE_SIZE:
+            return boards
+        start += REBUILD_PAGE_SIZE
+
+
+async def rebuild_leaderboards():
+    """Rebuild every leaderboard from test_results, called on startup"""
+    global _boards
+    try:
+        boards = await asyncio.to_thread(_load_all_results)
+        # Keep results recorded while the rebuild was running
+        for question_set_id, board in _boards.items():
+            for entry in board._entries.values():
+                boards.setdefault(question_set_id, Leaderboard()).upsert(entry)
+        _boards = boards
+        print(f"🏆 Rebuilt leaderboards for {len(_boards)} tests")
+    except Exception as e:
+        print(f"❌ Failed to rebuild leaderboards: {e}")
@@ -0,0 +1,102 @@
+import os
+import asyncio
+from datetime import datetime, timezone
+from db.repository import repository
+
+# Rows deleted per request
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "500"))
+PURGE_MAX_ATTEMPTS = int(os.getenv("PURGE_MAX_ATTEMPTS", "5"))
+PURGE_RETRY_BASE_SECONDS = float(os.getenv("PURGE_RETRY_BASE_SECONDS", "2"))
+
+# Dependent tables deleted in chunks before the question set itself
+_CHUNKED_TABLES = ("test_results", "questions")
+
+_queue: asyncio.Queue = asyncio.Queue()
+_progress: dict[str, dict] = {}
+_worker_task = None
+
+
+def _purge(test_id: str, progress: dict):
+    for table in _CHUNKED_TABLES:
+        progress["stage"] = table
+        while True:
+            deleted = repository.delete_chunk_for_set(table, test_id, PURGE_CHUNK_SIZE)
+            progress["deleted"][table] += deleted
+            if deleted < PURGE_CHUNK_SIZE:
+                break
+
+    # At most one checkpoint per candidate, and the table has no id column
+    progress["stage"] = "test_checkpoints"
+    progress["deleted"]["test_checkpoints"] += repository.delete_checkpoints_for_set(test_id)
+
+    progress["stage"] = "question_sets"
+    repository.delete_question_set(test_id)
+
+
+def schedule_purge(test_id: str):
+    if _progress.get(test_id, {}).get("state") in ("queued", "running"):
+        return
+    _progress[test_id] = {
+        "state": "queued",
+        "stage": None,
+        "attempts": 0,
+        "deleted": {"test_results": 0, "questions": 0, "test_checkpoints": 0},
+        "error": None,
+        "finished_at": None,
+    }
+    _queue.put_nowait(test_id)
+
+
+def purge_status(test_id: str):
+    return _progress.get(test_id)
+
+
+async def _worker():
+    while True:
+        test_id = await _queue.get()
+        progress = _progress[test_id]
+        try:
+            progress["state"] = "running"
+            progress["attempts"] += 1
+            await asyncio.to_thread(_purge, test_id, progress)
+            progress.update(state="done", stage=None, error=None,
+                            finished_at=datetime.now(timezone.utc).isoformat())
+            print(f"🗑️ Purged test {test_id}: {progress['deleted']}")
+        except Exception as e:
+            progress["error"] = str(e)
+            print(f"❌ Purge of test {test_id} failed (attempt {progress['attempts']}): {e}")
+            if progress["attempts"] < PURGE_MAX_ATTEMPTS:
+                # Chunks already deleted stay deleted, the retry picks up where this one stopped
+                progress["state"] = "queued"
+                asyncio.get_running_loop().call_later(
+                    PURGE_RETRY_BASE_SECONDS * 2 ** (progress["attempts"] - 1),
+                    _queue.put_nowait, test_id
+                )
+            else:
+                progress["state"] = "failed"
+        finally:
+            _queue.task_done()
+
+
+def _resume_pending():
+    """Re-schedule tests that were soft deleted but not purged before a restart"""
+    try:
+        return repository.list_soft_deleted_question_set_ids()
+    except Exception as e:
+        print(f"❌ Failed to load pending purges: {e}")
+        return []
+
+
+async def start_purger():
+    global _worker_task
+    if _worker_task is None:
+        _worker_task = asyncio.create_task(_worker())
+        for test_id in await asyncio.to_thread(_resume_pending):
+            schedule_purge(test_id)
+
+
+def stop_purger():
+    global _worker_task
+    if _worker_task is not None:
+        _worker_task.cancel()
+        _worker_task = None
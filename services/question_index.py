@@ -0,0 +1,171 @@
+import os
+import re
+import zlib
+import numpy as np
+from db.repository import repository
+
+# Dimension of the hashed bag-of-words embeddings
+EMBEDDING_DIM = 4096
+
+# Cosine similarity above which a stored question is reused for a new test
+REUSE_SIMILARITY = float(os.getenv("QUESTION_REUSE_SIMILARITY", "0.25"))
+
+# Cosine similarity above which two questions are considered the same question
+DUPLICATE_SIMILARITY = float(os.getenv("QUESTION_DUPLICATE_SIMILARITY", "0.9"))
+
+# Stored questions of the same JD are ranked ahead of other JDs. The bonus only reorders
+# questions that already pass REUSE_SIMILARITY on their own, it never lets one through
+SAME_JD_BONUS = 0.2
+
+# Most recent questions loaded from Supabase on startup
+INDEX_MAX_ROWS = int(os.getenv("QUESTION_INDEX_MAX_ROWS", "5000"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9_+#]+(?:\.[a-z0-9_+#]+)*")
+
+# Words that carry no topic and would otherwise dominate short questions
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "in", "is", "it", "of", "on", "or", "that", "the", "this", "to", "what", "which", "with", "you",
+}
+
+
+def embed(text: str) -> np.ndarray:
+    """
+    Hashed unigram + bigram embedding with sublinear term frequency, L2 normalized
+    """
+    tokens = [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    vec = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vec[h % EMBEDDING_DIM] += 1.0 if (h >> 31) & 1 else -1.0
+
+    vec = np.sign(vec) * np.log1p(np.abs(vec))
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+def question_kind(question: dict) -> str:
+    return "mcq" if question.get("options") else "coding"
+
+
+class QuestionIndex:
+    """In-memory cosine similarity index over generated questions"""
+
+    def __init__(self):
+        self.questions: list[dict] = []
+        self.jd_ids: list = []
+        self.kinds: list[str] = []
+        self.difficulties: list = []
+        self._vectors: list[np.ndarray] = []
+        self._matrix = None
+        self.loaded = False
+
+    def __len__(self):
+        return len(self.questions)
+
+    def _matrix_view(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.vstack(self._vectors) if self._vectors else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        return self._matrix
+
+    def add(self, questions: list, jd_id=None, difficulty=None):
+        """Index finalized questions, only these are offered for reuse"""
+        for q in questions:
+            self.questions.append({
+                "question": q["question"],
+                "options": q.get("options"),
+                "answer": q.get("answer"),
+            })
+            self.jd_ids.append(jd_id)
+            self.kinds.append(question_kind(q))
+            self.difficulties.append(difficulty)
+            self._vectors.append(embed(q["question"]))
+        self._matrix = None
+
+    def load(self):
+        """Build the index from the most recent rows of the questions table"""
+        try:
+            rows = [r for r in repository.list_recent_questions(INDEX_MAX_ROWS) if r.get("question")]
+            seen = set()
+            for row in rows:
+                key = row["question"].strip().lower()
+                if key in seen:
+                    continue
+                seen.add(key)
+                self.add([row], row.get("jd_id"), row.get("difficulty"))
+            print(f"🗂️ Question index loaded with {len(self)} questions")
+        except Exception as e:
+            print(f"❌ Failed to load question index: {e}")
+        self.loaded = True
+
+    def _reusable(self, kind: str, difficulty=None) -> np.ndarray:
+        """Mask of the stored questions search() may offer for this kind and difficulty"""
+        mask = np.array([kd == kind for kd in self.kinds], dtype=bool)
+        if difficulty:
+            # Questions of unknown difficulty are never offered for a specific one
+            wanted = difficulty.strip().lower()
+            mask &= np.array([(d or "").strip().lower() == wanted for d in self.difficulties], dtype=bool)
+        return mask
+
+    def search(self, text: str, kind: str, k: int, jd_id=None, difficulty=None, exclude=()) -> list:
+        """
+        Return up to k stored questions of the given kind and difficulty
+        whose similarity to text passes REUSE_SIMILARITY
+        """
+        if k <= 0 or not self.questions:
+            return []
+
+        similarity = self._matrix_view() @ embed(text)
+        similarity[~self._reusable(kind, difficulty)] = -np.inf
+        ranking = similarity
+        if jd_id:
+            ranking = similarity + SAME_JD_BONUS * np.array([j == jd_id for j in self.jd_ids], dtype=np.float32)
+
+        matches = []
+        for i in np.argsort(-ranking):
+            if ranking[i] < REUSE_SIMILARITY or len(matches) == k:
+                break
+            if similarity[i] < REUSE_SIMILARITY or self.questions[i]["question"] in exclude:
+                continue
+            matches.append(dict(self.questions[i]))
+        return matches
+
+    def drop_duplicates(self, questions: list, difficulty=None, existing=()) -> list:
+        """
+        Swap generated questions that nearly duplicate a stored question search() could have offered
+        for that stored question, and drop the ones duplicating existing or each other
+        """
+        if not questions:
+            return []
+
+        matrix = self._matrix_view()
+        reusable = {}
+        taken = [embed(q["question"]) for q in existing]
+        kept, swapped = [], 0
+        for q in questions:
+            vector = embed(q["question"])
+            if len(matrix):
+                kind = question_kind(q)
+                if kind not in reusable:
+                    reusable[kind] = self._reusable(kind, difficulty)
+                scores = matrix @ vector
+                scores[~reusable[kind]] = -np.inf
+                best = int(np.argmax(scores))
+                if scores[best] >= DUPLICATE_SIMILARITY:
+                    q, vector = dict(self.questions[best]), self._vectors[best]
+                    swapped += 1
+            if any(float(t @ vector) >= DUPLICATE_SIMILARITY for t in taken):
+                continue
+            kept.append(q)
+            taken.append(vector)
+
+        if swapped:
+            print(f"♻️ Swapped {swapped} generated questions for the stored questions they duplicate")
+        if len(kept) < len(questions):
+            print(f"🧹 Dropped {len(questions) - len(kept)} near-duplicate generated questions")
+        return kept
+
+
+question_index = QuestionIndex()
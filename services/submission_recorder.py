@@ -0,0 +1,38 @@
+import os
+import json
+import asyncio
+from datetime import datetime, timezone
+from schemas.test_schemas import TestSubmission
+
+# JSONL file that graded submissions are appended to, recording is off when unset
+RECORD_SUBMISSIONS_PATH = os.getenv("RECORD_SUBMISSIONS_PATH")
+
+# Personal data grading doesn't need, never written to disk
+_UNRECORDED_FIELDS = {"candidate_name", "candidate_email"}
+
+
+def _append(line: str):
+    with open(RECORD_SUBMISSIONS_PATH, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+async def record_submission(submission: TestSubmission, result: dict):
+    """Keep a submission and its LLM grade for offline replay with tasks/replay_evaluations.py"""
+    if not RECORD_SUBMISSIONS_PATH or not result.get("model"):
+        return
+    line = json.dumps({
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "model": result["model"],
+        "submission": submission.dict(exclude=_UNRECORDED_FIELDS),
+        "result": {
+            "score": result.get("score"),
+            "max_score": result.get("max_score"),
+            "percentage": result.get("percentage"),
+            "status": result.get("status"),
+            "question_scores": result.get("question_scores"),
+        },
+    }, default=str)
+    try:
+        await asyncio.to_thread(_append, line)
+    except Exception as e:
+        print(f"❌ Failed to record submission: {e}")
@@ -2,11 +2,24 @@ import os
 import httpx
 import re
 from schemas.test_schemas import TestSubmission
+from services.circuit_breaker import openrouter_breaker, is_upstream_failure
+from services import token_accounting
+from db.repository import repository
 from dotenv import load_dotenv
 
 load_dotenv()
 
-async def evaluate_test(submission: TestSubmission):
+EVALUATION_PENDING = "Evaluation pending"
+NEEDS_MANUAL_REVIEW = "Needs manual review"
+
+# Statuses of a submission the LLM actually scored
+GRADED_STATUSES = ("Pass", "Fail")
+
+EVALUATION_MODEL = os.getenv("EVALUATION_MODEL", "mistralai/mistral-7b-instruct:free")
+EVALUATION_MAX_TOKENS = int(os.getenv("EVALUATION_MAX_TOKENS", "2000"))
+EVALUATION_API_URL = os.getenv("EVALUATION_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+def build_evaluation_prompt(submission: TestSubmission) -> str:
     # Enhanced prompt with clearer instructions
     prompt = (
         "You are an expert HR evaluator tasked with scoring a candidate's test submission.\n\n"
@@ -54,6 +67,12 @@ async def evaluate_test(submission: TestSubmission):
         prompt += f"Candidate's Answer: {answer}\n"
         prompt += "---\n"
 
+    return prompt
+
+
+async def evaluate_test(submission: TestSubmission):
+    prompt = build_evaluation_prompt(submission)
+
     headers = {
         "Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY')}",
         "HTTP-Referer": "https://your-actual-domain.com",
@@ -61,22 +80,50 @@ async def evaluate_test(submission: TestSubmission):
         "Content-Type": "application/json"
     }
 
+    # Fall back to a cheaper model or to local grading when the token budget runs low
+    question_set_id = str(submission.question_set_id)
+    estimated_tokens = len(prompt) // 4 + EVALUATION_MAX_TOKENS
+    try:
+        mode, model = token_accounting.grading_plan(question_set_id, EVALUATION_MODEL, estimated_tokens)
+    except Exception as e:
+        print(f"❌ Could not check token budget, grading with the default model: {e}")
+        mode, model = token_accounting.LLM, EVALUATION_MODEL
+    if mode == token_accounting.LOCAL:
+        print("🪙 Token budget exhausted, grading locally")
+        return grade_locally(submission, "token budget exhausted")
+
     payload = {
-        "model": "mistralai/mistral-7b-instruct:free",
+        "model": model,
         "messages": [{"role": "user", "content": prompt}],
         "temperature": 0.1,  # Lower temperature for more consistent scoring
-        "max_tokens": 2000
+        "max_tokens": EVALUATION_MAX_TOKENS,
+        "usage": {"include": True}
     }
 
+    # Don't wait for a timeout when OpenRouter is known to be down, the submission is graded later
+    if not openrouter_breaker.allow_request():
+        print("⚡ OpenRouter circuit open, deferring evaluation")
+        return {
+            "score": 0,
+            "max_score": len(submission.questions) * 10,
+            "status": EVALUATION_PENDING,
+            "raw_feedback": "Grading service unavailable, the submission will be evaluated shortly"
+        }
+
     try:
         async with httpx.AsyncClient() as client:
             response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
+                EVALUATION_API_URL,
                 json=payload,
                 headers=headers,
                 timeout=60
             )
 
+            if is_upstream_failure(response.status_code):
+                openrouter_breaker.record_failure()
+            else:
+                openrouter_breaker.record_success()
+
             if response.status_code != 200:
                 error_data = response.json().get("error", {})
                 print(f"⚠️ Evaluation API error: {response.status_code} - {error_data.get('message', 'Unknown error')}")
@@ -87,11 +134,19 @@ async def evaluate_test(submission: TestSubmission):
                     "raw_feedback": f"API Error: {error_data.get('message', 'Unknown error')}"
                 }
 
-            content = response.json()["choices"][0]["message"]["content"]
+            data = response.json()
+            llm_usage = token_accounting.empty_usage()
+            token_accounting.add_usage(llm_usage, model, data.get("usage"))
+            token_accounting.record(
+                model, data.get("usage"), question_set_id=question_set_id, candidate_id=submission.candidate_id
+            )
+
+            content = data["choices"][0]["message"]["content"]
             print("📬 Raw model output:\n", content)
 
             # Enhanced score extraction with multiple patterns
             score, max_score = extract_score_from_response(content, len(submission.questions))
+            question_scores = extract_question_scores(content, len(submission.questions))
             
             # Calculate percentage and determine status
             percentage = (score / max_score * 100) if max_score > 0 else 0
@@ -104,10 +159,14 @@ async def evaluate_test(submission: TestSubmission):
                 "max_score": max_score,
                 "percentage": percentage,
                 "status": status,
-                "raw_feedback": content
+                "raw_feedback": content,
+                "question_scores": question_scores,
+                "llm_usage": llm_usage,
+                "model": model
             }
 
     except httpx.RequestError as e:
+        openrouter_breaker.record_failure()
         print(f"❌ HTTP error during evaluation: {e}")
         return {
             "score": 0, 
@@ -126,11 +185,96 @@ async def evaluate_test(submission: TestSubmission):
         }
 
 
+def is_evaluation_error(result: dict) -> bool:
+    """True for "Network error", "Evaluation failed" and similar results that are worth retrying"""
+    return result.get("status") not in (*GRADED_STATUSES, EVALUATION_PENDING, NEEDS_MANUAL_REVIEW)
+
+
+def _normalize_answer(answer) -> str:
+    return " ".join(str(answer or "").split()).lower().rstrip(".")
+
+
+def _mcq_is_correct(answer, correct, options: list) -> bool:
+    """Compare an MCQ answer to the correct one, accepting option letters for either side"""
+    def resolve(value):
+        value = _normalize_answer(value)
+        if len(value) == 1 and "a" <= value <= "z" and ord(value) - ord("a") < len(options):
+            return _normalize_answer(options[ord(value) - ord("a")])
+        return value
+    return bool(_normalize_answer(correct)) and resolve(answer) == resolve(correct)
+
+
+def grade_locally(submission: TestSubmission, reason: str) -> dict:
+    """
+    Grade MCQs by comparing with the stored answers, without calling the LLM.
+    Coding questions are left ungraded for HR to review.
+    """
+    # Answers and options come from the DB only, the submitted copies are under the candidate's control
+    stored = repository.list_questions_for_set(str(submission.question_set_id), ("question", "options", "answer"))
+    stored_by_text = {q["question"]: q for q in stored}
+
+    lines, question_scores = [], []
+    for i, (question, answer) in enumerate(zip(submission.questions, submission.answers), 1):
+        stored_question = stored_by_text.get(question.question, {})
+        options = stored_question.get("options") if stored_question else question.options
+        if options:
+            score = 10 if _mcq_is_correct(answer, stored_question.get("answer"), options) else 0
+            lines.append(f"Q{i} - Type: MCQ - Score: {score}/10")
+        else:
+            score = None
+            lines.append(f"Q{i} - Type: Coding - Not graded")
+        question_scores.append(score)
+
+    max_score = len(submission.questions) * 10
+    score = sum(s for s in question_scores if s is not None)
+    percentage = (score / max_score * 100) if max_score > 0 else 0
+    if None in question_scores:
+        status = NEEDS_MANUAL_REVIEW
+    else:
+        status = "Pass" if percentage >= 50 else "Fail"
+
+    return {
+        "score": score,
+        "max_score": max_score,
+        "percentage": percentage,
+        "status": status,
+        "raw_feedback": f"Graded locally ({reason}).\n" + "\n".join(lines) + f"\nTOTAL SCORE: {score}/{max_score}",
+        "question_scores": question_scores,
+        "llm_usage": None
+    }
+
+
+def extract_question_scores(content: str, num_questions: int) -> list:
+    """
+    Extract the per-question scores from lines like "Q3 - Type: MCQ - Score: 10/10"
+    Returns: list of scores in question order, None where a question's score is missing
+    """
+    scores = [None] * num_questions
+    for number, score in re.findall(r"^\W*Q(\d+)\b.*?Score:\s*(\d+)\s*/\s*10", content, re.IGNORECASE | re.MULTILINE):
+        index = int(number) - 1
+        if 0 <= index < num_questions and scores[index] is None:
+            scores[index] = min(int(score), 10)
+    return scores
+
+
 def extract_score_from_response(content: str, num_questions: int) -> tuple[int, int]:
     """
     Extract score from LLM response using multiple parsing strategies
     Returns: (score, max_score)
     """
+    score, max_score, _ = parse_score(content, num_questions)
+    return score, max_score
+
+
+# Strategies of parse_score that only guess the score
+GUESSED_SCORE_STRATEGIES = ("status_inferred", "not_found")
+
+
+def parse_score(content: str, num_questions: int) -> tuple[int, int, str]:
+    """
+    Same as extract_score_from_response, also naming the strategy that matched
+    Returns: (score, max_score, strategy)
+    """
     max_score = num_questions * 10
     
     print(f"🔍 Attempting to extract score from response (expected max: {max_score})")
@@ -149,7 +293,7 @@ def extract_score_from_response(content: str, num_questions: int) -> tuple[int,
             score = int(match.group(1))
             extracted_max = int(match.group(2))
             print(f"✅ Found total score pattern '{pattern}': {score}/{extracted_max}")
-            return score, extracted_max
+            return score, extracted_max, "total"
 
     # Strategy 2: Sum individual question scores
     question_patterns = [
@@ -163,14 +307,14 @@ def extract_score_from_response(content: str, num_questions: int) -> tuple[int,
         if matches and len(matches) == num_questions:
             total_score = sum(int(match[1]) for match in matches)
             print(f"✅ Calculated from individual scores using pattern '{pattern}': {[match[1] for match in matches]} = {total_score}/{max_score}")
-            return total_score, max_score
+            return total_score, max_score, "per_question"
 
     # Strategy 3: Look for individual scores without question numbers
     score_matches = re.findall(r"Score:\s*(\d+)/10", content, re.IGNORECASE)
     if score_matches and len(score_matches) == num_questions:
         total_score = sum(int(score) for score in score_matches)
         print(f"✅ Calculated from individual scores: {score_matches} = {total_score}/{max_score}")
-        return total_score, max_score
+        return total_score, max_score, "scores_only"
 
     # Strategy 4: Look for any reasonable X/Y pattern
     all_score_patterns = re.findall(r"(\d+)\s*/\s*(\d+)", content)
@@ -181,17 +325,17 @@ def extract_score_from_response(content: str, num_questions: int) -> tuple[int,
         # Check if this looks like a reasonable total score
         if potential_max == max_score and 0 <= potential_score <= potential_max:
             print(f"✅ Found reasonable score pattern: {potential_score}/{potential_max}")
-            return potential_score, potential_max
+            return potential_score, potential_max, "ratio"
 
     # Strategy 5: Look for status and try to infer
     if "pass" in content.lower():
         # If it says pass, assume at least 50%
         min_pass_score = max_score // 2
         print(f"⚠️ Found 'Pass' status, inferring minimum passing score: {min_pass_score}/{max_score}")
-        return min_pass_score, max_score
+        return min_pass_score, max_score, "status_inferred"
     
     # Fallback: return 0 if nothing found
     print("❌ Could not extract score from response, defaulting to 0")
     print("📄 Response content for debugging:")
     print(content[:500] + "..." if len(content) > 500 else content)
-    return 0, max_score
\ No newline at end of file
+    return 0, max_score, "not_found"
\ No newline at end of file
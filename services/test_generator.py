@@ -3,12 +3,43 @@ import json
 import httpx
 from dotenv import load_dotenv
 from schemas.test_schemas import TestRequest
+from services.question_index import question_index, question_kind
+from services.circuit_breaker import openrouter_breaker, jd_summary_breaker, is_upstream_failure
+from services import token_accounting
 
 load_dotenv()
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
-async def call_model(model_name: str, prompt: str):
+# Upper bounds for upstream calls, in seconds
+GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", "60"))
+JD_SUMMARY_TIMEOUT = float(os.getenv("JD_SUMMARY_TIMEOUT", "15"))
+
+# Set to "false" to always generate every question with the LLM
+QUESTION_REUSE_ENABLED = os.getenv("QUESTION_REUSE_ENABLED", "true").lower() == "true"
+
+class GenerationFailed(Exception):
+    """No usable questions could be generated and the caller asked not to fall back to mock data"""
+
+
+def _requested_counts(request: TestRequest) -> dict:
+    if request.question_type == "coding":
+        return {"mcq": 0, "coding": request.num_questions}
+    if request.question_type == "mixed":
+        mcq_count = request.mcq_count if request.mcq_count else request.num_questions // 2
+        coding_count = request.coding_count if request.coding_count else request.num_questions - mcq_count
+        return {"mcq": mcq_count, "coding": coding_count}
+    return {"mcq": request.num_questions, "coding": 0}
+
+def _normalize_questions(result) -> list:
+    # Models sometimes wrap the array as {"questions": [...]}
+    if isinstance(result, dict):
+        result = result.get("questions", [result])
+    if not isinstance(result, list):
+        return []
+    return [q for q in result if isinstance(q, dict) and q.get("question")]
+
+async def call_model(model_name: str, prompt: str, usage: dict = None, jd_id: str = None):
     url = "https://openrouter.ai/api/v1/chat/completions"
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",  # Required for OpenRouter
@@ -21,53 +52,112 @@ async def call_model(model_name: str, prompt: str):
             {"role": "system", "content": "You are a JSON-generating assistant."},
             {"role": "user", "content": prompt},
         ],
+        "usage": {"include": True},
     }
 
+    if token_accounting.daily_budget_exhausted():
+        print(f"🪙 Daily token budget exhausted, skipping {model_name}")
+        return None
+
+    if not openrouter_breaker.allow_request():
+        print(f"⚡ OpenRouter circuit open, skipping {model_name}")
+        return None
+
     try:
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(timeout=GENERATION_TIMEOUT) as client:
             response = await client.post(url, headers=headers, json=body)
             print(f"🔵 {model_name} | Status:", response.status_code)
             print("🔵 Response preview:", response.text[:200])
 
+            if is_upstream_failure(response.status_code):
+                openrouter_breaker.record_failure()
+            else:
+                openrouter_breaker.record_success()
             response.raise_for_status()
 
             content = response.json()
+            token_accounting.record(model_name, content.get("usage"), jd_id=jd_id)
+            if usage is not None:
+                token_accounting.add_usage(usage, model_name, content.get("usage"))
+
             ai_text = content["choices"][0]["message"]["content"].strip()
             return json.loads(ai_text)
 
+    except httpx.RequestError as e:
+        openrouter_breaker.record_failure()
+        print(f"❌ {model_name} failed:", e)
+        return None
     except Exception as e:
         print(f"❌ {model_name} failed:", e)
         return None
 
 async def fetch_job_summary(jd_id: str):
     """Fetch job summary using the provided job description ID"""
+    if not jd_summary_breaker.allow_request():
+        print("⚡ Job Summary circuit open, skipping call")
+        return None
+
     try:
         JOB_SUMMARY_API_URL = f"https://react-ai-backend.onrender.com/api/jd/get-jd-summary/{jd_id}"
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(timeout=JD_SUMMARY_TIMEOUT) as client:
             headers = {
                 "Content-Type": "application/json",  # No JWT needed now
             }
             response = await client.get(JOB_SUMMARY_API_URL, headers=headers)
             print(f"🔵 Job Summary API | Status:", response.status_code)
+            if is_upstream_failure(response.status_code):
+                jd_summary_breaker.record_failure()
+            else:
+                jd_summary_breaker.record_success()
             response.raise_for_status()
             data = response.json()
             return data.get("jobSummary")
+    except httpx.RequestError as e:
+        jd_summary_breaker.record_failure()
+        print(f"❌ Job Summary API failed:", e)
+        return None
     except Exception as e:
         print(f"❌ Job Summary API failed:", e)
         return None
 
-async def generate_questions(request: TestRequest):
+async def generate_questions(request: TestRequest, usage: dict = None, allow_fallback: bool = True):
+    """
+    Questions for the request, reused from the index where possible and generated by the LLM otherwise.
+    When the job summary or the LLM fails, a mock summary, the reused questions or a mock question
+    are used, or GenerationFailed is raised if allow_fallback is False.
+    """
     # Use the jd_id from the request to fetch job summary
     job_summary = None
     if request.jd_id:
         job_summary = await fetch_job_summary(request.jd_id)
     
     if not job_summary:
+        if not allow_fallback:
+            raise GenerationFailed("Job summary is unavailable, questions would not match the JD")
         print("⚠️ Failed to fetch job summary, using fallback mock data")
         job_summary = "Mock job summary: Python developer role requiring skills in web development and data analysis."
     
     request.topic = job_summary
 
+    # Pull close matches from previously generated questions, the LLM only writes the rest
+    reused = []
+    if QUESTION_REUSE_ENABLED:
+        if not question_index.loaded:
+            question_index.load()
+        counts = _requested_counts(request)
+        for kind, count in counts.items():
+            reused += question_index.search(job_summary, kind, count, jd_id=request.jd_id, difficulty=request.difficulty)
+        remaining = {kind: count - sum(1 for q in reused if question_kind(q) == kind) for kind, count in counts.items()}
+        if reused:
+            print(f"♻️ Reusing {len(reused)} stored questions, generating {sum(remaining.values())} more")
+        if sum(remaining.values()) == 0:
+            return reused
+        request.num_questions = sum(remaining.values())
+        request.mcq_count = remaining["mcq"]
+        request.coding_count = remaining["coding"]
+        if request.question_type == "mixed" and 0 in remaining.values():
+            request.question_type = "mcq" if remaining["mcq"] else "coding"
+
     if request.question_type == "coding":
         prompt = (
             f"Generate {request.num_questions} {request.difficulty} level coding questions "
@@ -76,8 +166,9 @@ async def generate_questions(request: TestRequest):
             "Do NOT include explanations."
         )
     elif request.question_type == "mixed":
-        mcq_count = getattr(request, "mcq_count", request.num_questions // 2)
-        coding_count = getattr(request, "coding_count", request.num_questions - mcq_count)
+        counts = _requested_counts(request)
+        mcq_count = counts["mcq"]
+        coding_count = counts["coding"]
 
         prompt = (
             f"Generate a mixed set of {mcq_count + coding_count} {request.difficulty} level questions "
@@ -95,13 +186,19 @@ async def generate_questions(request: TestRequest):
             "question, options (list of 4), and answer."
         )
 
-    result = await call_model("qwen/qwen3-coder:free", prompt)
+    result = await call_model("qwen/qwen3-coder:free", prompt, usage, request.jd_id)
 
     if not result:
         print("⚠️ Falling back to mistralai/mistral-7b-instruct:free")
-        result = await call_model("mistralai/mistral-7b-instruct:free", prompt)
+        result = await call_model("mistralai/mistral-7b-instruct:free", prompt, usage, request.jd_id)
+
+    result = _normalize_questions(result)
 
     if not result:
+        if not allow_fallback:
+            raise GenerationFailed("Question generation failed, the LLM returned no questions")
+        if reused:
+            return reused
         result = [
             {
                 "question": "Mock Question: What is Python?",
@@ -109,5 +206,10 @@ async def generate_questions(request: TestRequest):
                 "answer": "A programming language"
             }
         ]
+        return result
+
+    if QUESTION_REUSE_ENABLED:
+        # A stored question the LLM rewrote is served as stored, so the test keeps its length
+        result = question_index.drop_duplicates(result, request.difficulty, existing=reused)
 
-    return result
+    return reused + result
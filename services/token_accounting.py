@@ -0,0 +1,162 @@
+import os
+from uuid import uuid4
+from collections import OrderedDict
+from datetime import datetime, timezone
+from db.repository import repository
+
+# Token budgets, 0 means unlimited
+DAILY_TOKEN_BUDGET = int(os.getenv("DAILY_TOKEN_BUDGET", "0"))
+TEST_TOKEN_BUDGET = int(os.getenv("TEST_TOKEN_BUDGET", "0"))  # default for sets without token_budget
+
+# Past this share of a budget, grading switches to BUDGET_DOWNGRADE_MODEL when one is configured
+BUDGET_DOWNGRADE_RATIO = float(os.getenv("BUDGET_DOWNGRADE_RATIO", "0.8"))
+BUDGET_DOWNGRADE_MODEL = os.getenv("BUDGET_DOWNGRADE_MODEL")
+
+# Max /generate-test calls whose usage waits for /finalize-test, the oldest are dropped first
+PENDING_GENERATIONS_MAX = int(os.getenv("PENDING_GENERATIONS_MAX", "10000"))
+
+LLM = "llm"
+LOCAL = "local"
+
+
+def empty_usage() -> dict:
+    return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0, "calls": 0, "models": {}}
+
+
+def add_usage(target: dict, model: str, usage: dict):
+    """Add the usage block of one OpenRouter response (or another usage dict) to target"""
+    if not usage:
+        return
+    for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        target[key] += usage.get(key) or 0
+    target["cost"] = round(target["cost"] + (usage.get("cost") or 0.0), 6)
+    target["calls"] += usage.get("calls", 1)
+    if model:
+        target["models"][model] = target["models"].get(model, 0) + (usage.get("total_tokens") or 0)
+    for name, tokens in (usage.get("models") or {}).items():
+        target["models"][name] = target["models"].get(name, 0) + tokens
+
+
+_day = None
+_daily = empty_usage()
+_by_jd: dict[str, dict] = {}
+_by_candidate: dict[str, dict] = {}
+# question_set_id -> {"usage": ..., "budget": ...}, loaded from the DB on first use
+_by_test: dict[str, dict] = {}
+# generation_id -> usage of a /generate-test call whose test isn't finalized yet
+_generations: OrderedDict[str, dict] = OrderedDict()
+
+
+def _roll_day():
+    global _day, _daily
+    today = datetime.now(timezone.utc).date()
+    if _day != today:
+        _day, _daily = today, empty_usage()
+
+
+def _test_entry(question_set_id: str) -> dict:
+    entry = _by_test.get(question_set_id)
+    if entry is None:
+        usage = empty_usage()
+        for row_usage in repository.list_result_usage(question_set_id):
+            add_usage(usage, None, row_usage)
+        question_set = repository.get_question_set(question_set_id) or {}
+        add_usage(usage, None, question_set.get("llm_usage"))
+        entry = {
+            "usage": usage,
+            "budget": question_set.get("token_budget") or TEST_TOKEN_BUDGET,
+            "jd_id": question_set.get("jd_id")
+        }
+        _by_test[question_set_id] = entry
+    return entry
+
+
+def record(model: str, usage: dict, jd_id=None, question_set_id=None, candidate_id=None):
+    """Account one LLM call against the day, and the JD, test and candidate it was made for"""
+    if not usage:
+        return
+    _roll_day()
+    add_usage(_daily, model, usage)
+    if question_set_id and not jd_id and question_set_id in _by_test:
+        jd_id = _by_test[question_set_id]["jd_id"]
+    if jd_id:
+        add_usage(_by_jd.setdefault(jd_id, empty_usage()), model, usage)
+    if candidate_id:
+        add_usage(_by_candidate.setdefault(candidate_id, empty_usage()), model, usage)
+    if question_set_id and question_set_id in _by_test:
+        add_usage(_by_test[question_set_id]["usage"], model, usage)
+
+
+def remember_generation(usage: dict) -> str:
+    """Keep the usage of one generation until its test is finalized, returns the generation id"""
+    generation_id = str(uuid4())
+    _generations[generation_id] = usage
+    while len(_generations) > PENDING_GENERATIONS_MAX:
+        _generations.popitem(last=False)
+    return generation_id
+
+
+def claim_generation(generation_id) -> dict:
+    """Usage recorded under generation_id, handed out once, None when unknown"""
+    return _generations.pop(generation_id, None) if generation_id else None
+
+
+def daily_budget_exhausted() -> bool:
+    _roll_day()
+    return bool(DAILY_TOKEN_BUDGET) and _daily["total_tokens"] >= DAILY_TOKEN_BUDGET
+
+
+def grading_plan(question_set_id: str, model: str, estimated_tokens: int):
+    """
+    Pick how to grade a submission given the budgets.
+    Returns (LLM, model) or (LOCAL, None).
+    """
+    _roll_day()
+    ratios = []
+    if DAILY_TOKEN_BUDGET:
+        ratios.append((_daily["total_tokens"] + estimated_tokens) / DAILY_TOKEN_BUDGET)
+    entry = _test_entry(question_set_id)
+    if entry["budget"]:
+        ratios.append((entry["usage"]["total_tokens"] + estimated_tokens) / entry["budget"])
+
+    worst = max(ratios, default=0)
+    if worst > 1:
+        return LOCAL, None
+    if worst >= BUDGET_DOWNGRADE_RATIO and BUDGET_DOWNGRADE_MODEL:
+        return LLM, BUDGET_DOWNGRADE_MODEL
+    return LLM, model
+
+
+def load_today():
+    """Seed today's counter from usage stored on test_results and question_sets"""
+    _roll_day()
+    since = datetime.combine(_day, datetime.min.time(), tzinfo=timezone.utc).isoformat()
+    try:
+        for usage in repository.list_usage_since(since):
+            add_usage(_daily, None, usage)
+        print(f"🪙 Loaded today's LLM usage: {_daily['total_tokens']} tokens")
+    except Exception as e:
+        print(f"❌ Failed to load today's LLM usage: {e}")
+
+
+def test_summary(question_set_id: str) -> dict:
+    entry = _test_entry(question_set_id)
+    return {
+        "test_id": question_set_id,
+        "usage": entry["usage"],
+        "budget": entry["budget"] or None,
+        "remaining": entry["budget"] - entry["usage"]["total_tokens"] if entry["budget"] else None
+    }
+
+
+def summary() -> dict:
+    _roll_day()
+    return {
+        "date": _day.isoformat(),
+        "daily": _daily,
+        "daily_budget": DAILY_TOKEN_BUDGET or None,
+        "daily_remaining": DAILY_TOKEN_BUDGET - _daily["total_tokens"] if DAILY_TOKEN_BUDGET else None,
+        "by_jd": _by_jd,
+        "by_test": {test_id: entry["usage"] for test_id, entry in _by_test.items()},
+        "by_candidate": _by_candidate
+    }
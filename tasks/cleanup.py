@@ -1,6 +1,6 @@
-from db.supabase import supabase
+from db.repository import repository
 from datetime import datetime
 
 def delete_expired_tests():
     now = datetime.utcnow().isoformat()
-    supabase.table("questions").delete().lt("expires_at", now).execute()
+    repository.delete_expired_questions(now)
@@ -0,0 +1,204 @@
+"""
+Replay recorded submissions against a grading model and report latency,
+score parse failures and agreement with the reference grades.
+
+Record submissions by setting RECORD_SUBMISSIONS_PATH on the API, then:
+
+    python -m tasks.replay_evaluations recordings.jsonl --model mistralai/mistral-7b-instruct:free
+    python -m tasks.replay_evaluations recordings.jsonl --stub --stub-latency 0.3 --concurrency 32
+
+The reference grade of a record is its "reference" object when present
+(e.g. a grade reviewed by HR), otherwise the recorded production result.
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import contextlib
+
+# Replays never touch the production database
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+
+import httpx
+from schemas.test_schemas import TestSubmission
+from services.test_evaluator import (
+    build_evaluation_prompt,
+    parse_score,
+    extract_question_scores,
+    GUESSED_SCORE_STRATEGIES,
+    EVALUATION_API_URL,
+    EVALUATION_MODEL,
+    EVALUATION_MAX_TOKENS,
+)
+
+
+def load_records(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def stub_transport(latency: float) -> httpx.MockTransport:
+    """Local stand-in for the model endpoint, answers in the expected format after `latency` seconds"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        prompt = json.loads(request.content)["messages"][-1]["content"]
+        blocks = re.findall(r"\nQ(\d+): .*?Type: (MCQ|Coding)\nCandidate's Answer: (.*?)\n---", prompt, re.DOTALL)
+        lines, total = [], 0
+        for number, kind, answer in blocks:
+            digest = int(hashlib.md5(answer.encode("utf-8")).hexdigest(), 16)
+            score = (digest % 2) * 10 if kind == "MCQ" else (digest % 6) * 2
+            total += score
+            lines.append(f"Q{number} - Type: {kind} - Score: {score}/10")
+        max_score = len(blocks) * 10
+        lines.append(f"TOTAL SCORE: {total}/{max_score}")
+        lines.append(f"STATUS: {'Pass' if max_score and total >= max_score / 2 else 'Fail'}")
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "\n".join(lines)}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 20 * len(blocks), "total_tokens": 0},
+        })
+    return httpx.MockTransport(handler)
+
+
+async def grade(client: httpx.AsyncClient, args, record: dict) -> dict:
+    # Recordings leave out the candidate's name and email
+    submission = TestSubmission(**{"candidate_name": "", "candidate_email": "", **record["submission"]})
+    num_questions = len(submission.questions)
+    payload = {
+        "model": args.model,
+        "messages": [{"role": "user", "content": build_evaluation_prompt(submission)}],
+        "temperature": 0.1,
+        "max_tokens": args.max_tokens,
+    }
+    outcome = {"candidate_id": submission.candidate_id, "question_set_id": str(submission.question_set_id)}
+
+    started = time.perf_counter()
+    try:
+        response = await client.post(args.base_url, json=payload, timeout=args.timeout)
+        outcome["latency"] = time.perf_counter() - started
+        response.raise_for_status()
+        content = response.json()["choices"][0]["message"]["content"]
+    except Exception as e:
+        outcome.setdefault("latency", time.perf_counter() - started)
+        outcome["error"] = str(e)
+        return outcome
+
+    score, max_score, strategy = parse_score(content, num_questions)
+    outcome.update(
+        score=score,
+        max_score=max_score,
+        percentage=(score / max_score * 100) if max_score else 0,
+        parse_strategy=strategy,
+        question_scores=extract_question_scores(content, num_questions),
+    )
+    return outcome
+
+
+def percentile(values: list, p: float):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low, high = int(k), min(int(k) + 1, len(values) - 1)
+    return round(values[low] + (values[high] - values[low]) * (k - low), 4)
+
+
+def report(records: list, outcomes: list, wall_time: float) -> dict:
+    latencies = [o["latency"] for o in outcomes if "latency" in o]
+    graded = [(r, o) for r, o in zip(records, outcomes) if "error" not in o]
+    parse_failures = sum(1 for _, o in graded if o["parse_strategy"] in GUESSED_SCORE_STRATEGIES)
+
+    pct_errors, exact, verdicts, item_matches, item_total = [], 0, 0, 0, 0
+    for record, outcome in graded:
+        reference = record.get("reference") or record.get("result") or {}
+        if reference.get("score") is None or not reference.get("max_score"):
+            continue
+        ref_pct = reference["score"] / reference["max_score"] * 100
+        pct_errors.append(abs(outcome["percentage"] - ref_pct))
+        exact += outcome["score"] == reference["score"]
+        verdicts += (outcome["percentage"] >= 50) == (ref_pct >= 50)
+        for ours, theirs in zip(outcome["question_scores"], reference.get("question_scores") or []):
+            if ours is not None and theirs is not None:
+                item_total += 1
+                item_matches += ours == theirs
+
+    compared = len(pct_errors)
+    return {
+        "records": len(records),
+        "graded": len(graded),
+        "errors": len(outcomes) - len(graded),
+        "wall_time_seconds": round(wall_time, 3),
+        "throughput_per_second": round(len(outcomes) / wall_time, 3) if wall_time else None,
+        "latency_seconds": {
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(max(latencies), 4) if latencies else None,
+        },
+        "parse_failure_rate": round(parse_failures / len(graded), 4) if graded else None,
+        "agreement": {
+            "compared": compared,
+            "exact_total_rate": round(exact / compared, 4) if compared else None,
+            "pass_fail_rate": round(verdicts / compared, 4) if compared else None,
+            "mean_abs_percentage_error": round(sum(pct_errors) / compared, 2) if compared else None,
+            "within_10_points_rate": round(sum(e <= 10 for e in pct_errors) / compared, 4) if compared else None,
+            "per_question_rate": round(item_matches / item_total, 4) if item_total else None,
+        },
+    }
+
+
+async def replay(args) -> dict:
+    records = load_records(args.recordings)
+    if args.limit:
+        records = records[:args.limit]
+
+    headers = {"Content-Type": "application/json"}
+    if args.api_key:
+        headers["Authorization"] = f"Bearer {args.api_key}"
+    transport = stub_transport(args.stub_latency) if args.stub else None
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(headers=headers, transport=transport) as client:
+        async def run(record):
+            async with semaphore:
+                return await grade(client, args, record)
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(run(r) for r in records))
+        wall_time = time.perf_counter() - started
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for outcome in outcomes:
+                f.write(json.dumps(outcome) + "\n")
+
+    return report(records, outcomes, wall_time)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded submissions against a grading model")
+    parser.add_argument("recordings", help="JSONL file written with RECORD_SUBMISSIONS_PATH")
+    parser.add_argument("--model", default=EVALUATION_MODEL)
+    parser.add_argument("--base-url", default=EVALUATION_API_URL, help="OpenAI-compatible chat completions URL")
+    parser.add_argument("--api-key", default=os.getenv("OPENROUTER_API_KEY"))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--max-tokens", type=int, default=EVALUATION_MAX_TOKENS)
+    parser.add_argument("--limit", type=int, help="Only replay the first N records")
+    parser.add_argument("--stub", action="store_true", help="Use a local stub instead of a model endpoint")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Seconds the stub waits per call")
+    parser.add_argument("--output", help="Write per-record outcomes to this JSONL file")
+    args = parser.parse_args(argv)
+
+    # The grading helpers log to stdout, keep it for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        summary = asyncio.run(replay(args))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,11 @@
+import pytest
+import db.repository
+from db.sqlite_repository import SQLiteRepository
+
+
+@pytest.fixture
+def sqlite_repository(tmp_path, monkeypatch):
+    """Point the process-wide repository at a fresh SQLite file"""
+    repo = SQLiteRepository(str(tmp_path / "app.db"))
+    monkeypatch.setattr(db.repository, "_repository", repo)
+    return repo
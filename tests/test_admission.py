@@ -0,0 +1,120 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from schemas.test_schemas import BulkTestRequest
+from services import admission
+from services.admission import TokenBucket, BucketTable, RouteLimiter
+import routes.hr_routes as hr_routes
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+def _request(ip: str = "10.0.0.1") -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": [], "client": (ip, 1234)})
+
+
+def _admit_once(limiter: RouteLimiter, request: Request, candidate_key=None):
+    async def main():
+        async with limiter.admit(request, candidate_key):
+            pass
+    asyncio.run(main())
+
+
+def test_token_bucket_refills_up_to_burst(clock):
+    bucket = TokenBucket(rate=1, burst=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(1.0)
+
+    clock.now += 10
+    assert bucket.try_acquire(2) == 0
+    assert bucket.try_acquire() == pytest.approx(1.0)
+
+
+def test_bucket_table_drops_least_recently_seen_keys(monkeypatch, clock):
+    monkeypatch.setattr(admission, "ADMISSION_MAX_TRACKED_KEYS", 2)
+    table = BucketTable(rate_per_minute=60, burst=1)
+    for key in ("a", "b", "a", "c"):
+        table.try_acquire(key)
+    assert len(table) == 2
+    assert table.try_acquire("c") > 0
+    # "b" was dropped, so it starts again from a full bucket
+    assert table.try_acquire("b") == 0
+
+
+def test_rate_limited_ip_gets_429_with_retry_after(clock):
+    limiter = RouteLimiter("t", ip_rate_per_minute=60, ip_burst=1,
+                           candidate_rate_per_minute=0, candidate_burst=0, max_in_flight=0)
+    _admit_once(limiter, _request())
+    with pytest.raises(HTTPException) as rejected:
+        _admit_once(limiter, _request())
+    assert rejected.value.status_code == 429
+    assert rejected.value.headers["Retry-After"] == "2"
+    assert limiter.rate_limited_ip == 1
+
+    # Another address has its own bucket
+    _admit_once(limiter, _request("10.0.0.2"))
+
+
+def test_rate_limited_candidate_gets_429(clock):
+    limiter = RouteLimiter("t", ip_rate_per_minute=60, ip_burst=10,
+                           candidate_rate_per_minute=6, candidate_burst=1, max_in_flight=0)
+    _admit_once(limiter, _request(), "Cand-1")
+    with pytest.raises(HTTPException) as rejected:
+        _admit_once(limiter, _request("10.0.0.2"), " cand-1 ")
+    assert rejected.value.status_code == 429
+    assert limiter.rate_limited_candidate == 1
+
+
+def test_full_route_sheds_with_503():
+    limiter = RouteLimiter("t", ip_rate_per_minute=0, ip_burst=0,
+                           candidate_rate_per_minute=0, candidate_burst=0, max_in_flight=1)
+
+    async def main():
+        async with limiter.admit(_request()):
+            assert limiter.in_flight == 1
+            with pytest.raises(HTTPException) as rejected:
+                async with limiter.admit(_request()):
+                    pass
+            return rejected.value
+
+    rejected = asyncio.run(main())
+    assert rejected.status_code == 503
+    assert rejected.headers["Retry-After"] == str(admission.SHED_RETRY_AFTER_SECONDS)
+    assert limiter.in_flight == 0
+    assert limiter.shed == 1
+
+
+def test_bulk_creation_reports_throttled_tests_as_failed(sqlite_repository, monkeypatch, clock):
+    limiter = RouteLimiter("generation", ip_rate_per_minute=10, ip_burst=5,
+                           candidate_rate_per_minute=0, candidate_burst=0, max_in_flight=10)
+    monkeypatch.setattr(hr_routes, "generation_limiter", limiter)
+
+    async def generate(request, usage=None, allow_fallback=True):
+        return [{"question": f"Question for {request.jd_id}", "options": ["a", "b"], "answer": "a"}]
+
+    monkeypatch.setattr(hr_routes, "generate_questions", generate)
+    request = BulkTestRequest(tests=[
+        {"jd_id": f"jd-{i}", "difficulty": "easy", "num_questions": 1} for i in range(12)
+    ])
+
+    response = asyncio.run(hr_routes.bulk_create_tests(request, _request()))
+    assert response["total_created"] == 5
+    assert response["total_failed"] == 7
+    failed = [test for test in response["tests"] if "error" in test]
+    assert all(test["error"].startswith("Rate limited") for test in failed)
+    assert limiter.in_flight == 0
@@ -0,0 +1,73 @@
+import asyncio
+from uuid import uuid4
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from schemas.test_schemas import AnswerCheckpoint
+from services import checkpoints, expiry_index
+from services.checkpoints import CheckpointBufferFull, save_checkpoint
+import routes.test_routes as test_routes
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    for state in (checkpoints._pending, expiry_index._active, expiry_index._heap,
+                  expiry_index._expired, expiry_index._unknown):
+        state.clear()
+    yield
+    checkpoints._pending.clear()
+
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/api/test/checkpoint",
+                    "headers": [], "client": ("10.1.0.1", 1234)})
+
+
+def _save(set_id: str):
+    checkpoint = AnswerCheckpoint(question_set_id=set_id, candidate_id=f"cand-{uuid4()}", answers=["a"])
+    return asyncio.run(test_routes.checkpoint_answers(checkpoint, _request()))
+
+
+def _insert_set(repo, expires_in_hours: float) -> str:
+    set_id = str(uuid4())
+    now = datetime.now(timezone.utc)
+    repo.insert_question_sets([{
+        "id": set_id, "jd_id": "jd-1", "duration": 30,
+        "created_at": now.isoformat(), "expires_at": (now + timedelta(hours=expires_in_hours)).isoformat()
+    }])
+    return set_id
+
+
+def test_checkpoint_for_unknown_test_is_rejected(sqlite_repository):
+    with pytest.raises(HTTPException) as rejected:
+        _save(str(uuid4()))
+    assert rejected.value.status_code == 404
+    assert checkpoints._pending == {}
+
+
+def test_checkpoint_for_expired_test_is_rejected(sqlite_repository):
+    with pytest.raises(HTTPException) as rejected:
+        _save(_insert_set(sqlite_repository, -1))
+    assert rejected.value.status_code == 410
+
+
+def test_checkpoint_for_tracked_test_skips_the_db(sqlite_repository, monkeypatch):
+    set_id = _insert_set(sqlite_repository, 2)
+    assert _save(set_id)["message"] == "Checkpoint saved"
+
+    def no_db(question_set_id):
+        raise AssertionError("the expiry index already knows this test")
+
+    monkeypatch.setattr(sqlite_repository, "get_question_set", no_db)
+    assert _save(set_id)["message"] == "Checkpoint saved"
+    assert len(checkpoints._pending) == 2
+
+
+def test_pending_buffer_is_bounded(monkeypatch):
+    monkeypatch.setattr(checkpoints, "CHECKPOINT_MAX_PENDING", 1)
+    save_checkpoint("set", "c1", ["a"])
+    # The candidate already buffered may keep overwriting its own state
+    save_checkpoint("set", "c1", ["b"])
+    with pytest.raises(CheckpointBufferFull):
+        save_checkpoint("set", "c2", ["a"])
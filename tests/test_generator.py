@@ -0,0 +1,20 @@
+import asyncio
+import pytest
+from schemas.test_schemas import TestRequest as GenerationRequest
+from services import test_generator
+from services.test_generator import GenerationFailed, generate_questions
+
+
+def test_missing_job_summary_fails_without_fallback(monkeypatch):
+    async def no_summary(jd_id):
+        return None
+
+    async def model_must_not_run(*args, **kwargs):
+        raise AssertionError("the LLM was called with the mock job summary")
+
+    monkeypatch.setattr(test_generator, "fetch_job_summary", no_summary)
+    monkeypatch.setattr(test_generator, "call_model", model_must_not_run)
+    request = GenerationRequest(topic="", difficulty="easy", num_questions=2, jd_id="jd-1")
+
+    with pytest.raises(GenerationFailed):
+        asyncio.run(generate_questions(request, allow_fallback=False))
@@ -0,0 +1,132 @@
+import asyncio
+import pytest
+from starlette.requests import Request
+from schemas.test_schemas import TestSubmission as Submission
+from services import idempotency, checkpoints
+from services.idempotency import derive_submission_key, run_once, replay_latest
+import routes.test_routes as test_routes
+from db.sqlite_repository import SQLiteRepository
+
+SET_ID = "00000000-0000-0000-0000-000000000001"
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    idempotency._entries.clear()
+    idempotency._latest.clear()
+    checkpoints._pending.clear()
+    yield
+    idempotency._entries.clear()
+    idempotency._latest.clear()
+    checkpoints._pending.clear()
+
+
+def _submission(answers=("a",)) -> Submission:
+    return Submission(
+        question_set_id=SET_ID, candidate_id="c1", candidate_name="N", candidate_email="e",
+        questions=[{"question": "Q1", "options": ["a", "b"]}],
+        answers=list(answers) if answers is not None else None
+    )
+
+
+def _counting_handler(result: dict, delay: float = 0):
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return dict(result)
+    return handler, calls
+
+
+def test_derive_submission_key_depends_on_answers():
+    assert derive_submission_key(_submission(["a"])) == derive_submission_key(_submission(["a"]))
+    assert derive_submission_key(_submission(["a"])) != derive_submission_key(_submission(["b"]))
+
+
+def test_duplicate_in_flight_waits_for_the_first_call():
+    handler, calls = _counting_handler({"status": "Pass"}, delay=0.05)
+
+    async def main():
+        return await asyncio.gather(run_once("k", handler), run_once("k", handler))
+
+    first, second = asyncio.run(main())
+    assert len(calls) == 1
+    assert first == {"status": "Pass"}
+    assert second == {"status": "Pass", "idempotent_replay": True}
+
+
+def test_completed_result_is_replayed():
+    handler, calls = _counting_handler({"status": "Pass"})
+
+    async def main():
+        await run_once("k", handler, scope="s")
+        return await run_once("k", handler, scope="s")
+
+    assert asyncio.run(main())["idempotent_replay"] is True
+    assert len(calls) == 1
+    assert replay_latest("s") == {"status": "Pass", "idempotent_replay": True}
+
+
+def test_non_cacheable_result_runs_again():
+    handler, calls = _counting_handler({"status": "Network error"})
+    cacheable = lambda result: result["status"] == "Pass"
+
+    async def main():
+        await run_once("k", handler, cacheable, scope="s")
+        return await run_once("k", handler, cacheable, scope="s")
+
+    assert "idempotent_replay" not in asyncio.run(main())
+    assert len(calls) == 2
+    assert replay_latest("s") is None
+
+
+def test_retry_after_cancelled_call_keeps_cacheable_and_scope():
+    handler, calls = _counting_handler({"status": "Network error"}, delay=0.05)
+    cacheable = lambda result: result["status"] == "Pass"
+
+    async def main():
+        original = asyncio.create_task(run_once("k", handler, cacheable, scope="s"))
+        await asyncio.sleep(0.01)
+        retry = asyncio.create_task(run_once("k", handler, cacheable, scope="s"))
+        await asyncio.sleep(0.01)
+        original.cancel()
+        return await retry
+
+    assert asyncio.run(main()) == {"status": "Network error"}
+    assert len(calls) == 2
+    assert "k" not in idempotency._entries
+
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/api/test/submit",
+                    "headers": [], "client": ("10.0.0.1", 1234)})
+
+
+def test_failed_insert_keeps_checkpoint_and_is_not_replayed(sqlite_repository, monkeypatch):
+    async def evaluate(submission):
+        return {"score": 10, "max_score": 10, "percentage": 100.0, "status": "Pass", "raw_feedback": ""}
+
+    async def no_op(*args, **kwargs):
+        pass
+
+    def insert_fails(rows):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(test_routes, "evaluate_test", evaluate)
+    monkeypatch.setattr(test_routes, "record_submission", no_op)
+    monkeypatch.setattr(test_routes, "publish_event", no_op)
+    monkeypatch.setattr(sqlite_repository, "insert_test_results", insert_fails)
+    checkpoints.save_checkpoint(SET_ID, "c1", ["a"])
+
+    first = asyncio.run(test_routes.submit_test(_submission(answers=None), _request(), None))
+    assert first["database_error"] == "database down"
+    assert checkpoints.get_checkpoint(SET_ID, "c1")["answers"] == ["a"]
+
+    monkeypatch.setattr(sqlite_repository, "insert_test_results", SQLiteRepository.insert_test_results.__get__(sqlite_repository))
+
+    retry = asyncio.run(test_routes.submit_test(_submission(answers=None), _request(), None))
+    assert "idempotent_replay" not in retry
+    assert retry["database_error"] is None
+    assert sqlite_repository.count_results_for_set(SET_ID) == 1
+    assert checkpoints.get_checkpoint(SET_ID, "c1") is None
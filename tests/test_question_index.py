@@ -0,0 +1,45 @@
+from services.question_index import QuestionIndex
+
+STORED = {"question": "Explain the difference between a Python list and a tuple", "options": ["a", "b"], "answer": "a"}
+
+
+def _index(difficulty="easy", jd_id="jd-1") -> QuestionIndex:
+    index = QuestionIndex()
+    index.add([STORED], jd_id, difficulty)
+    return index
+
+
+def test_search_matches_kind_and_difficulty():
+    index = _index()
+    text = "Python list tuple difference"
+    assert index.search(text, "mcq", 5, difficulty="Easy") == [STORED]
+    assert index.search(text, "mcq", 5, difficulty="hard") == []
+    assert index.search(text, "coding", 5) == []
+
+
+def test_same_jd_bonus_does_not_let_unrelated_questions_through():
+    index = _index()
+    # Similarity is about 0.1, below REUSE_SIMILARITY even though the JD matches
+    assert index.search("Python developer, lists and tuples", "mcq", 5, jd_id="jd-1") == []
+
+
+def test_generated_duplicate_of_reusable_question_is_swapped_for_it():
+    index = _index()
+    rewritten = dict(STORED, question=STORED["question"] + "?", answer="b")
+    fresh = {"question": "What does a Python decorator do", "options": ["a", "b"], "answer": "a"}
+
+    kept = index.drop_duplicates([rewritten, fresh], "easy")
+    assert kept == [STORED, fresh]
+
+
+def test_duplicates_of_questions_search_cannot_offer_are_kept():
+    index = _index(difficulty="hard")
+    generated = dict(STORED, answer="b")
+    assert index.drop_duplicates([generated], "easy") == [generated]
+
+
+def test_duplicates_within_the_test_are_dropped():
+    index = QuestionIndex()
+    generated = {"question": "What does a Python decorator do", "options": ["a", "b"], "answer": "a"}
+    assert index.drop_duplicates([generated, dict(generated)]) == [generated]
+    assert index.drop_duplicates([generated], existing=[generated]) == []
@@ -0,0 +1,197 @@
+"""
+Behaviour every Repository backend must share.
+
+SQLite and the read-through wrapper run everywhere. Supabase runs only with
+REPOSITORY_TEST_SUPABASE=true and SUPABASE_URL/SUPABASE_SERVICE_ROLE_KEY pointing at a scratch project.
+
+    python -m pytest
+"""
+import os
+from uuid import uuid4
+from datetime import datetime, timedelta, timezone
+import pytest
+from db.repository import create_repository
+from db.sqlite_repository import SQLiteRepository, ReadThroughRepository
+
+NOW = datetime.now(timezone.utc)
+
+
+def _iso(delta_hours: float = 0) -> str:
+    return (NOW + timedelta(hours=delta_hours)).isoformat()
+
+
+@pytest.fixture(params=["sqlite", "supabase+sqlite-cache", "supabase"])
+def repo(request, tmp_path):
+    if request.param == "sqlite":
+        yield SQLiteRepository(str(tmp_path / "repo.db"))
+        return
+    if request.param == "supabase+sqlite-cache":
+        # The wrapper's contract doesn't depend on its primary, SQLite keeps the test offline
+        yield ReadThroughRepository(SQLiteRepository(str(tmp_path / "primary.db")),
+                                    SQLiteRepository(str(tmp_path / "cache.db")))
+        return
+    if os.getenv("REPOSITORY_TEST_SUPABASE", "false").lower() != "true":
+        pytest.skip("set REPOSITORY_TEST_SUPABASE=true to run against Supabase")
+    pytest.importorskip("supabase")
+    yield create_repository("supabase")
+
+
+@pytest.fixture
+def make_set(repo):
+    """Insert a question set with questions, purged again after the test"""
+    created = []
+
+    def make(jd_id=None, expires_in_hours=2, questions=("What is a list?", "Reverse a string")):
+        set_id = str(uuid4())
+        jd_id = jd_id or f"jd-{uuid4()}"
+        repo.insert_question_sets([{
+            "id": set_id, "jd_id": jd_id, "duration": 30,
+            "created_at": _iso(), "expires_at": _iso(expires_in_hours)
+        }])
+        repo.insert_questions([{
+            "question_set_id": set_id, "jd_id": jd_id, "question": text,
+            "options": ["a", "b", "c", "d"] if i % 2 == 0 else None, "answer": "a",
+            "created_at": _iso(-i / 60), "expires_at": _iso(expires_in_hours)
+        } for i, text in enumerate(questions)])
+        created.append(set_id)
+        return set_id, jd_id
+
+    yield make
+    for set_id in created:
+        for table in ("test_results", "questions"):
+            while repo.delete_chunk_for_set(table, set_id, 500):
+                pass
+        repo.delete_checkpoints_for_set(set_id)
+        repo.delete_question_set(set_id)
+
+
+def test_question_set_lifecycle(repo, make_set):
+    set_id, jd_id = make_set()
+    assert repo.get_question_set(set_id)["jd_id"] == jd_id
+    assert repo.list_question_set_ids_for_jd(jd_id) == [set_id]
+    assert set_id in [row["id"] for row in repo.list_active_question_sets(_iso())]
+
+    assert repo.update_question_set_expiry(set_id, _iso(-1))
+    assert set_id not in [row["id"] for row in repo.list_active_question_sets(_iso())]
+
+    assert repo.soft_delete_question_set(set_id, _iso())
+    assert repo.get_question_set(set_id) is None
+    assert not repo.soft_delete_question_set(set_id, _iso())
+    assert set_id in repo.list_soft_deleted_question_set_ids()
+    assert set_id not in [row["id"] for row in repo.list_question_sets()]
+
+
+def test_questions_for_set(repo, make_set):
+    set_id, _ = make_set()
+    questions = repo.list_questions_for_set(set_id, ("question", "options"))
+    assert questions == [
+        {"question": "What is a list?", "options": ["a", "b", "c", "d"]},
+        {"question": "Reverse a string", "options": None},
+    ]
+    # A second read is answered the same way, from the cache where there is one
+    assert repo.list_questions_for_set(set_id, ("question", "answer"))[0] == {"question": "What is a list?", "answer": "a"}
+    assert repo.count_questions_for_set(set_id) == 2
+
+
+def test_page_questions_by_jd(repo, make_set):
+    jd_id = f"jd-{uuid4()}"
+    make_set(jd_id, questions=[f"Question {i}" for i in range(5)])
+
+    seen, cursor = [], None
+    while True:
+        rows, total = repo.page_questions_by_jd(
+            jd_id, ["id", "question", "created_at"], 2, cursor=cursor, include_total=cursor is None
+        )
+        if cursor is None:
+            assert total == 5
+        seen += [row["question"] for row in rows]
+        if len(rows) < 2:
+            break
+        cursor = (rows[-1]["created_at"], rows[-1]["id"])
+    assert seen == [f"Question {i}" for i in range(5)]
+
+    mcq, _ = repo.page_questions_by_jd(jd_id, ["question"], 10, question_type="mcq")
+    assert [row["question"] for row in mcq] == ["Question 0", "Question 2", "Question 4"]
+    expired, _ = repo.page_questions_by_jd(jd_id, ["question"], 10, status="expired", now=_iso())
+    assert expired == []
+
+
+def test_page_questions_by_jd_follows_the_set(repo, make_set):
+    jd_id = f"jd-{uuid4()}"
+    extended, _ = make_set(jd_id, expires_in_hours=-1, questions=["Extended"])
+    deleted, _ = make_set(jd_id, questions=["Deleted"])
+    repo.update_question_set_expiry(extended, _iso(2))
+    repo.soft_delete_question_set(deleted, _iso())
+
+    active, total = repo.page_questions_by_jd(jd_id, ["question"], 10, status="active", now=_iso(), include_total=True)
+    assert [row["question"] for row in active] == ["Extended"]
+    assert total == 1
+    expired, _ = repo.page_questions_by_jd(jd_id, ["question"], 10, status="expired", now=_iso())
+    assert expired == []
+    everything, _ = repo.page_questions_by_jd(jd_id, ["question"], 10)
+    assert [row["question"] for row in everything] == ["Extended"]
+
+
+def test_results(repo, make_set):
+    set_id, _ = make_set()
+    candidate_id = f"cand-{uuid4()}"
+    rows = repo.insert_test_results([{
+        "candidate_id": candidate_id, "question_set_id": set_id, "score": 10, "max_score": 20,
+        "status": "Evaluation pending", "question_scores": [10, None],
+        "pending_submission": {"candidate_id": candidate_id, "answers": ["a", "b"]}
+    }])
+    result_id = rows[0]["id"]
+
+    assert repo.existing_candidate_ids([candidate_id, "nobody"]) == {candidate_id}
+    assert repo.count_results_for_set(set_id) == 1
+    assert repo.list_question_scores(set_id) == [[10, None]]
+    pending = [row for row in repo.list_pending_evaluations() if row["id"] == result_id]
+    assert pending[0]["pending_submission"]["answers"] == ["a", "b"]
+
+    repo.update_test_result(result_id, {"status": "Pass", "score": 20, "pending_submission": None})
+    assert repo.list_results_by_candidate(candidate_id)[0]["status"] == "Pass"
+    assert result_id not in [row["id"] for row in repo.list_pending_evaluations()]
+
+
+def test_page_scored_results_filters_statuses(repo, make_set):
+    set_id, _ = make_set()
+    repo.insert_test_results([
+        {"candidate_id": "graded", "question_set_id": set_id, "score": 10, "max_score": 20, "status": "Pass"},
+        {"candidate_id": "errored", "question_set_id": set_id, "score": 0, "max_score": 20, "status": "Network error"},
+    ])
+    rows = [row for row in repo.page_scored_results(0, 1000, ("Pass", "Fail")) if row["question_set_id"] == set_id]
+    assert [row["candidate_id"] for row in rows] == ["graded"]
+
+
+def test_checkpoints(repo, make_set):
+    set_id, _ = make_set()
+    repo.upsert_checkpoints([{"question_set_id": set_id, "candidate_id": "c1", "answers": ["a"], "updated_at": _iso()}])
+    repo.upsert_checkpoints([{"question_set_id": set_id, "candidate_id": "c1", "answers": ["b"], "updated_at": _iso()}])
+    assert repo.get_checkpoint(set_id, "c1")["answers"] == ["b"]
+
+    repo.delete_checkpoint(set_id, "c1")
+    assert repo.get_checkpoint(set_id, "c1") is None
+
+
+def test_delete_chunk_for_set(repo, make_set):
+    set_id, _ = make_set(questions=[f"Question {i}" for i in range(5)])
+    assert repo.delete_chunk_for_set("questions", set_id, 3) == 3
+    assert repo.delete_chunk_for_set("questions", set_id, 3) == 2
+    assert repo.delete_chunk_for_set("questions", set_id, 3) == 0
+
+
+def test_read_through_cache_keeps_one_copy(tmp_path):
+    primary = SQLiteRepository(str(tmp_path / "primary.db"))
+    first = ReadThroughRepository(primary, SQLiteRepository(str(tmp_path / "cache.db")))
+    second = ReadThroughRepository(primary, SQLiteRepository(str(tmp_path / "cache.db")))
+    set_id = str(uuid4())
+    primary.insert_questions([
+        {"question_set_id": set_id, "question": "Q1", "created_at": _iso()},
+        {"question_set_id": set_id, "question": "Q2", "created_at": _iso()},
+    ])
+    rows = primary.list_questions_for_set(set_id, ("id", "question_set_id", "question", "created_at"))
+
+    # Both workers missed before either filled the cache
+    first.cache.cache_questions(rows)
+    second.cache.cache_questions(rows)
+    assert second.list_questions_for_set(set_id, ("question",)) == [{"question": "Q1"}, {"question": "Q2"}]
@@ -0,0 +1,36 @@
+import asyncio
+from schemas.test_schemas import TestFinalizeRequest as FinalizeRequest
+from services import token_accounting
+import routes.hr_routes as hr_routes
+
+
+def _usage(tokens: int) -> dict:
+    usage = token_accounting.empty_usage()
+    token_accounting.add_usage(usage, "model", {"total_tokens": tokens})
+    return usage
+
+
+def test_generation_usage_is_claimed_once():
+    generation_id = token_accounting.remember_generation(_usage(100))
+    assert token_accounting.claim_generation(generation_id)["total_tokens"] == 100
+    assert token_accounting.claim_generation(generation_id) is None
+    assert token_accounting.claim_generation(None) is None
+
+
+def test_pending_generations_are_bounded(monkeypatch):
+    monkeypatch.setattr(token_accounting, "PENDING_GENERATIONS_MAX", 1)
+    first = token_accounting.remember_generation(_usage(1))
+    second = token_accounting.remember_generation(_usage(2))
+    assert token_accounting.claim_generation(first) is None
+    assert token_accounting.claim_generation(second)["total_tokens"] == 2
+
+
+def test_finalize_stores_the_usage_recorded_at_generation(sqlite_repository):
+    generation_id = token_accounting.remember_generation(_usage(250))
+    request = FinalizeRequest(
+        questions=[{"question": "Q1", "options": ["a", "b"], "answer": "a"}],
+        jd_id="jd-1", difficulty="easy", generation_id=generation_id,
+        llm_usage={"total_tokens": 1}  # a client-echoed block is ignored
+    )
+    test_id = asyncio.run(hr_routes.finalize_test(request))["test_id"]
+    assert sqlite_repository.get_question_set(test_id)["llm_usage"]["total_tokens"] == 250
@@ -0,0 +1,70 @@
+import os
+import json
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # orjson not installed, fall back to the stdlib encoder
+    orjson = None
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse encoded with orjson. Kept here rather than using fastapi.responses.ORJSONResponse,
+    which newer FastAPI releases deprecate; our routes return plain dicts without response models,
+    so FastAPI's own Pydantic serialization doesn't apply to them.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+DefaultResponse = ORJSONResponse if orjson else JSONResponse
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+
+def _loads(body: bytes):
+    return orjson.loads(body) if orjson else json.loads(body)
+
+
+async def msgpack_negotiation(request: Request, call_next):
+    """
+    Re-encode JSON responses as msgpack for clients sending Accept: application/x-msgpack
+    """
+    response = await call_next(request)
+    if msgpack is None or MSGPACK_MEDIA_TYPE not in request.headers.get("accept", ""):
+        return response
+    if not response.headers.get("content-type", "").startswith("application/json"):
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = {k: v for k, v in response.headers.items() if k.lower() not in ("content-length", "content-type")}
+    return Response(
+        content=msgpack.packb(_loads(body), use_bin_type=True),
+        status_code=response.status_code,
+        headers=headers,
+        media_type=MSGPACK_MEDIA_TYPE,
+    )
+
+
+def add_compression(app):
+    """
+    Compress responses above COMPRESSION_MIN_SIZE with brotli when available, gzip otherwise
+    """
+    try:
+        from brotli_asgi import BrotliMiddleware
+        # BrotliMiddleware falls back to gzip for clients that don't accept br
+        app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_SIZE, gzip_fallback=True)
+    except ImportError:
+        from fastapi.middleware.gzip import GZipMiddleware
+        app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)